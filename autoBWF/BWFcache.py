@@ -0,0 +1,163 @@
+"""Persistent cache of parsed BWF metadata.
+
+Parsed metadata are stored in an SQLite database in the user cache directory appropriate to the OS. An entry is
+indexed by the real path of the file and is only used if the size, modification time (in nanoseconds) and inode
+number of the file are unchanged, so that files modified by other programs are re-read automatically. Files
+written by autoBWF itself are additionally invalidated explicitly by BWFfileIO. Once the cache holds more than
+max_entries files, the least recently used entries are evicted (the size is checked every 100 insertions).
+
+The same database also holds file digests (see autoBWF.BWFdigest) for filesystems that do not support extended
+attributes. These are validated in the same way, but are not subject to eviction.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+
+def cache_file():
+    """Return the path of the metadata cache database in the user cache directory appropriate to the OS."""
+    from appdirs import AppDirs
+
+    dirs = AppDirs("autoBWF", "UHEC")
+    return os.path.join(dirs.user_cache_dir, "metadata.sqlite")
+
+
+class MetadataCache:
+    """SQLite-backed cache of parsed metadata, safe to share between threads and processes.
+
+    Args:
+        path (str): The cache database file, by default cache_file().
+        max_entries (int): The maximum number of files kept in the cache.
+    """
+
+    def __init__(self, path=None, max_entries=100000):
+        self.path = path or cache_file()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS metadata (
+                                path TEXT PRIMARY KEY,
+                                size INTEGER, mtime_ns INTEGER, inode INTEGER,
+                                last_used INTEGER,
+                                value TEXT)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS metadata_last_used ON metadata (last_used)")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS digests (
+                                path TEXT, name TEXT,
+                                size INTEGER, mtime_ns INTEGER, inode INTEGER,
+                                digest TEXT,
+                                PRIMARY KEY (path, name))""")
+
+    @staticmethod
+    def key(filename):
+        """Return the (realpath, size, mtime_ns, inode) tuple identifying the current state of filename.
+
+        Raises:
+            OSError: If filename cannot be stat()-ed.
+        """
+        path = os.path.realpath(filename)
+        st = os.stat(path)
+        return path, st.st_size, st.st_mtime_ns, st.st_ino
+
+    def get(self, filename):
+        """Return the cached value for filename, or None if there is no valid entry."""
+        try:
+            path, size, mtime_ns, inode = self.key(filename)
+        except OSError:
+            return None
+
+        with self._lock:
+            try:
+                row = self._db.execute("SELECT value FROM metadata WHERE path=? AND size=? AND mtime_ns=? AND inode=?",
+                                       (path, size, mtime_ns, inode)).fetchone()
+                if row is None:
+                    return None
+                self._db.execute("UPDATE metadata SET last_used=? WHERE path=?", (self._clock(), path))
+            except sqlite3.Error:
+                return None
+        return json.loads(row[0])
+
+    def put(self, filename, value):
+        """Store value (which must be JSON-serializable) as the cached value for filename."""
+        try:
+            path, size, mtime_ns, inode = self.key(filename)
+        except OSError:
+            return
+
+        with self._lock:
+            try:
+                self._db.execute("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?)",
+                                 (path, size, mtime_ns, inode, self._clock(), json.dumps(value)))
+                self._inserts += 1
+                if self._inserts % 100 == 1:
+                    self._evict()
+            except sqlite3.Error:
+                pass
+
+    def get_digest(self, filename, name):
+        """Return the digest called name (e.g. "data.md5") stored for filename, or None if there is no valid one."""
+        try:
+            path, size, mtime_ns, inode = self.key(filename)
+        except OSError:
+            return None
+
+        with self._lock:
+            try:
+                row = self._db.execute("""SELECT digest FROM digests
+                                          WHERE path=? AND name=? AND size=? AND mtime_ns=? AND inode=?""",
+                                       (path, name, size, mtime_ns, inode)).fetchone()
+            except sqlite3.Error:
+                return None
+        return row[0] if row is not None else None
+
+    def put_digest(self, filename, name, digest):
+        """Store the digest called name for filename."""
+        try:
+            path, size, mtime_ns, inode = self.key(filename)
+        except OSError:
+            return
+
+        with self._lock:
+            try:
+                self._db.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?)",
+                                 (path, name, size, mtime_ns, inode, digest))
+            except sqlite3.Error:
+                pass
+
+    def invalidate(self, filename):
+        """Discard the cached value and digests for filename, if any."""
+        path = os.path.realpath(filename)
+        with self._lock:
+            try:
+                self._db.execute("DELETE FROM metadata WHERE path=?", (path,))
+                self._db.execute("DELETE FROM digests WHERE path=?", (path,))
+            except sqlite3.Error:
+                pass
+
+    def clear(self):
+        """Discard all cached values (but not the digests)."""
+        with self._lock:
+            self._db.execute("DELETE FROM metadata")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _evict(self):
+        """Delete the least recently used entries beyond max_entries. Must be called with the lock held."""
+        count = self._db.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute("""DELETE FROM metadata WHERE path IN
+                                (SELECT path FROM metadata ORDER BY last_used LIMIT ?)""",
+                             (count - self.max_entries,))
+
+    @staticmethod
+    def _clock():
+        import time
+        return int(time.time() * 1000000)
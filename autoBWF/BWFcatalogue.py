@@ -0,0 +1,168 @@
+"""Persistent, queryable catalogue of the metadata of an archive of BWF files.
+
+The catalogue is an SQLite database (by default in the user data directory appropriate to the OS) with a row for
+each file, holding every field of autoBWF.BWFfileIO.BWFRecord in a column of its own, so that the archive can be
+searched with SQL without reading any files. The OriginalFilename, FileUse, ICRD, ISRC and OriginationDate columns
+are indexed. Each row also records the size and modification time (in nanoseconds) of the file, and is only used
+while these are unchanged, so that the catalogue can be brought up to date incrementally by update().
+
+A catalogue is also used by the BWF file IO functions as a source of metadata if it is set as the catalogue of their
+Backend: BWFRecords of unchanged files are then filled from the catalogue, and those of other files are added to it
+once all their fields have been extracted.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+#: The indexed columns
+indexed = ["OriginalFilename", "FileUse", "ICRD", "ISRC", "OriginationDate"]
+
+
+def catalogue_file():
+    """Return the path of the default catalogue database in the user data directory appropriate to the OS."""
+    from appdirs import AppDirs
+
+    dirs = AppDirs("autoBWF", "UHEC")
+    return os.path.join(dirs.user_data_dir, "catalogue.sqlite")
+
+
+class Catalogue:
+    """SQLite catalogue of the metadata of BWF files, safe to share between threads and processes.
+
+    The table "files" has the columns "path" (the absolute path of the file, its primary key), "size", "mtime_ns",
+    "record" (the groups of fields of the BWFRecord, as JSON) and a column for each field of BWFRecord.fields other
+    than "filename".
+
+    Args:
+        path (str): The catalogue database file, by default catalogue_file().
+    """
+
+    def __init__(self, path=None):
+        from autoBWF.BWFfileIO import BWFRecord
+
+        self.path = path or catalogue_file()
+        self.fields = [k for k in BWFRecord.fields if k != "filename"]
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = "".join(', "{}" TEXT'.format(k) for k in self.fields)
+        self._db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                         "record TEXT{})".format(columns))
+        existing = [row[1] for row in self._db.execute("PRAGMA table_info(files)")]
+        for k in self.fields:
+            if k not in existing:
+                self._db.execute('ALTER TABLE files ADD COLUMN "{}" TEXT'.format(k))
+        for k in indexed:
+            self._db.execute('CREATE INDEX IF NOT EXISTS "files_{0}" ON files ("{0}")'.format(k))
+
+        self._insert = 'INSERT OR REPLACE INTO files (path, size, mtime_ns, record, {}) VALUES (?, ?, ?, ?, {})'.format(
+            ", ".join('"{}"'.format(k) for k in self.fields), ", ".join("?" for _ in self.fields))
+
+    @staticmethod
+    def key(filename):
+        """Return the (absolute path, size, mtime_ns) tuple identifying the current state of filename.
+
+        Raises:
+            OSError: If filename cannot be stat()-ed.
+        """
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        return path, st.st_size, st.st_mtime_ns
+
+    def get(self, filename):
+        """Return the groups of fields catalogued for filename, or None if it is not catalogued in its current state.
+
+        Returns:
+            dict: The dicts of fields of each group ("core", "tech" and "xmp"), as in BWFRecord.loaded.
+        """
+        try:
+            key = self.key(filename)
+        except OSError:
+            return None
+
+        with self._lock:
+            try:
+                row = self._db.execute("SELECT record FROM files WHERE path=? AND size=? AND mtime_ns=?",
+                                       key).fetchone()
+            except sqlite3.Error:
+                return None
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, filename, groups):
+        """Catalogue filename with the given groups of fields (as in BWFRecord.loaded), which must be complete."""
+        from autoBWF.BWFfileIO import BWFRecord
+
+        try:
+            key = self.key(filename)
+        except OSError:
+            return
+
+        values = {}
+        for group in ["core", "tech", "xmp"]:
+            values.update((k, v) for k, v in groups[group].items() if k in BWFRecord.groups[group])
+        row = key + (json.dumps(groups),) + tuple(None if values.get(k) is None else str(values[k])
+                                                  for k in self.fields)
+        with self._lock:
+            try:
+                self._db.execute(self._insert, row)
+            except sqlite3.Error:
+                pass
+
+    def update(self, files, jobs=1, backend=None):
+        """Bring the catalogue up to date with files, extracting the metadata of those that are new or changed.
+
+        Args:
+            files (iterable): The names of the BWF files.
+            jobs (int): Number of batches of files extracted concurrently (see BWFfileIO.iter_bwf_records()).
+            backend (Backend): The configuration to use, by default BWFfileIO.default_backend().
+
+        Yields:
+            tuple: As BWFfileIO.iter_bwf_records(), for the files that were extracted.
+        """
+        from autoBWF.BWFfileIO import default_backend, iter_bwf_records
+
+        backend = (backend or default_backend())._replace(catalogue=self)
+        stale = (file for file in files if self.get(file) is None)
+        yield from iter_bwf_records(stale, jobs=jobs, backend=backend)
+
+    def prune(self):
+        """Remove the files that no longer exist from the catalogue, and return their number."""
+        with self._lock:
+            paths = [path for (path,) in self._db.execute("SELECT path FROM files")]
+        missing = [(path,) for path in paths if not os.path.exists(path)]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("DELETE FROM files WHERE path=?", missing)
+            self._db.execute("COMMIT")
+        return len(missing)
+
+    def query(self, where="", parameters=(), fields=None, order="path"):
+        """Yield the catalogued files matching an SQL condition.
+
+        Args:
+            where (str): An SQL expression over the columns of the files table (empty for all files).
+            parameters (tuple): Values for the "?" placeholders in where.
+            fields (list): The fields to return, by default all of them ("filename" is the path of the file).
+            order (str): The column by which the results are sorted.
+
+        Yields:
+            dict: The requested fields of each file.
+        """
+        fields = fields or ["filename"] + self.fields
+        columns = ", ".join('"path"' if k == "filename" else '"{}"'.format(k) for k in fields)
+        sql = "SELECT {} FROM files{} ORDER BY \"{}\"".format(columns, " WHERE " + where if where else "", order)
+        with self._lock:
+            rows = self._db.execute(sql, parameters).fetchall()
+        for row in rows:
+            yield dict(zip(fields, row))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,974 @@
+"""Read and write BWF metadata directly in the RIFF chunk structure of a Wave file.
+
+These functions walk the RIFF chunk list once and decode the bext, LIST/INFO, _PMX (XMP) and MD5 chunks without
+launching bwfmetaedit. Only the chunk headers and the (small) metadata chunks are read; the audio data is never
+touched.
+
+Metadata chunks (including the MD5 digest of the data chunk) are written in place whenever the new contents fit into the
+space occupied by the old chunk and any JUNK/padding chunks that follow it. Only if a chunk must grow beyond that space
+is the file rewritten, and then only once, into a temporary file that atomically replaces the original.
+
+Files are accessed through a read-only memory map, so classic RIFF files as well as RF64/BW64 files larger than
+4 GB (whose real chunk sizes are stored as 64-bit values in the ds64 chunk) can be indexed without being loaded.
+
+Attributes:
+    CORE_FIELDS (list): The column names of a "bwfmetaedit --out-core" CSV file, in the order that bwfmetaedit
+        emits them.
+    INFO_FIELDS (list): The subset of CORE_FIELDS that are stored in the LIST/INFO chunk.
+    TECH_FIELDS (list): The column names of a "bwfmetaedit --out-tech" CSV file, in the order that bwfmetaedit
+        emits them.
+"""
+
+import mmap
+import os
+import struct
+
+CORE_FIELDS = ["FileName", "Description", "Originator", "OriginatorReference", "OriginationDate",
+               "OriginationTime", "TimeReference (translated)", "TimeReference", "BextVersion", "UMID",
+               "LoudnessValue", "LoudnessRange", "MaxTruePeakLevel", "MaxMomentaryLoudness",
+               "MaxShortTermLoudness", "CodingHistory", "IARL", "IART", "ICMS", "ICMT", "ICOP", "ICRD", "IENG",
+               "IGNR", "IKEY", "IMED", "INAM", "IPRD", "ISBJ", "ISFT", "ISRC", "ISRF", "ITCH"]
+
+INFO_FIELDS = [field for field in CORE_FIELDS if len(field) == 4 and field.startswith("I") and field.isupper()]
+
+TECH_FIELDS = ["FileName", "FileSize", "DateCreated", "DateModified", "Format", "CodecID", "Channels", "SampleRate",
+               "BitRate", "BitPerSample", "Duration", "UnsupportedChunks", "bext", "INFO", "XMP", "aXML", "iXML",
+               "MD5Stored", "MD5Generated", "Errors", "Information"]
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xfffe
+
+# 32-bit chunk size placeholder meaning "look up the real size in the ds64 chunk"
+_RF64_PLACEHOLDER = 0xffffffff
+
+# Chunks whose only purpose is to reserve space, and which may be overwritten by growing metadata chunks
+_FILLER_CHUNKS = ["JUNK", "PAD ", "FLLR"]
+
+# Chunks that readers expect to find before the data chunk, and which therefore are never appended to the file
+_LEADING_CHUNKS = ["ds64", "fmt ", "bext"]
+
+_BEXT_FIELDS = ["Description", "Originator", "OriginatorReference", "OriginationDate", "OriginationTime",
+                "TimeReference", "CodingHistory"]
+
+# Chunks that autoBWF (or bwfmetaedit) knows how to interpret; anything else is reported as unsupported
+_SUPPORTED_CHUNKS = ["ds64", "fmt ", "data", "bext", "LIST", "_PMX", "MD5 ", "JUNK", "PAD ", "FLLR", "fact", "iXML",
+                     "aXML", "cue "]
+
+# Layout of the fixed-length part of the bext chunk (EBU Tech 3285 v2): field name, size in bytes
+_BEXT_LAYOUT = [("Description", 256), ("Originator", 32), ("OriginatorReference", 32),
+                ("OriginationDate", 10), ("OriginationTime", 8)]
+_BEXT_FIXED_SIZE = 602
+
+
+class NotWaveError(Exception):
+    """Raised when a file is not a RIFF/WAVE file or its chunk structure cannot be walked."""
+    pass
+
+
+class WriteError(Exception):
+    """Raised when metadata chunks cannot be written to a Wave file."""
+    pass
+
+
+class Chunk:
+    """The location of a single RIFF chunk.
+
+    Attributes:
+        id (str): The four-character chunk identifier (e.g. "bext", "LIST", "data").
+        offset (int): File offset of the chunk data (i.e. just past the 8-byte chunk header).
+        size (int): Size of the chunk data in bytes, not including any pad byte.
+        list_type (str): For LIST chunks, the four-character list type (e.g. "INFO"), otherwise None.
+    """
+
+    __slots__ = ["id", "offset", "size", "list_type"]
+
+    def __init__(self, chunk_id, offset, size, list_type=None):
+        self.id = chunk_id
+        self.offset = offset
+        self.size = size
+        self.list_type = list_type
+
+    def __repr__(self):
+        return "Chunk({!r}, offset={}, size={})".format(self.id, self.offset, self.size)
+
+
+def _is_chunk_id(ckid):
+    return len(ckid) == 4 and all(0x20 <= b <= 0x7e for b in ckid)
+
+
+def _fits(buf, pos):
+    """Return True if the chunk header at pos declares a size that fits into buf (or is an RF64 placeholder)."""
+    if pos + 8 > len(buf):
+        return False
+    size = struct.unpack_from("<I", buf, pos + 4)[0]
+    return size == _RF64_PLACEHOLDER or pos + 8 + size <= len(buf)
+
+
+def _read_ds64(buf, offset, size):
+    """Decode a ds64 chunk into a dict of 64-bit chunk sizes indexed by chunk identifier."""
+    sizes = {}
+    if size < 28:
+        return sizes
+    riff_size, data_size, sample_count, table_length = struct.unpack_from("<QQQI", buf, offset)
+    sizes["data"] = data_size
+    for i in range(min(table_length, (size - 28) // 12)):
+        ckid, ck_size = struct.unpack_from("<4sQ", buf, offset + 28 + 12 * i)
+        sizes[ckid.decode("ascii", errors="replace")] = ck_size
+    return sizes
+
+
+def walk_chunks(buf):
+    """Walk the top-level chunk list of a RIFF/WAVE, RF64 or BW64 file.
+
+    Chunks with an odd size are normally followed by a pad byte. Some software omits it, so the byte following an
+    odd-sized chunk is probed to decide whether the next chunk header starts on the odd or the even offset (and if
+    both offsets hold a plausible chunk identifier, whether the declared chunk size fits into the file).
+
+    In RF64/BW64 files, a chunk whose 32-bit size is 0xFFFFFFFF has its real size looked up in the ds64 chunk.
+
+    Args:
+        buf (buffer): The contents of the file, typically an mmap object.
+
+    Returns:
+        tuple: The four-character form type ("RIFF", "RF64" or "BW64"), a list of Chunk objects in file order, a
+            bool that is True if at least one odd-sized chunk lacks its pad byte, and a list of error strings
+            describing structural problems (empty if there are none).
+
+    Raises:
+        NotWaveError: If the file does not start with a RIFF/WAVE, RF64/WAVE or BW64/WAVE header.
+    """
+
+    file_size = len(buf)
+    if file_size < 12 or buf[0:4] not in (b"RIFF", b"RF64", b"BW64") or buf[8:12] != b"WAVE":
+        raise NotWaveError("not a RIFF/WAVE file")
+    form = buf[0:4].decode("ascii")
+
+    chunks = []
+    errors = []
+    nopadding = False
+    ds64_sizes = {}
+    pos = 12
+    while pos + 8 <= file_size:
+        ckid, size = struct.unpack_from("<4sI", buf, pos)
+        if not _is_chunk_id(ckid):
+            errors.append("invalid chunk identifier at offset {}".format(pos))
+            break
+
+        chunk = Chunk(ckid.decode("ascii"), pos + 8, size)
+        if chunk.id == "ds64" and form != "RIFF":
+            ds64_sizes = _read_ds64(buf, chunk.offset, size)
+        elif size == _RF64_PLACEHOLDER and chunk.id in ds64_sizes:
+            chunk.size = size = ds64_sizes[chunk.id]
+        if chunk.id == "LIST" and size >= 4:
+            chunk.list_type = buf[chunk.offset:chunk.offset + 4].decode("ascii", errors="replace")
+        chunks.append(chunk)
+
+        end = chunk.offset + size
+        if end > file_size:
+            errors.append("{} chunk is truncated".format(chunk.id))
+            break
+        if size % 2:
+            probe = buf[end:end + 5]
+            unpadded, padded = _is_chunk_id(probe[0:4]), _is_chunk_id(probe[1:5])
+            if unpadded and padded:
+                # both look like chunk identifiers (e.g. "LIST" followed by a printable size byte), so go by which
+                # of the two headers declares a size that fits into the file
+                unpadded, padded = _fits(buf, end), _fits(buf, end + 1)
+            if not probe or (unpadded and not padded):
+                nopadding = True
+            else:
+                end += 1
+        pos = end
+
+    if form != "RIFF" and not ds64_sizes:
+        errors.append("ds64 chunk is missing")
+    if not any(chunk.id == "fmt " for chunk in chunks):
+        errors.append("fmt chunk is missing")
+    if not any(chunk.id == "data" for chunk in chunks):
+        errors.append("data chunk is missing")
+
+    return form, chunks, nopadding, errors
+
+
+class WaveFile:
+    """A read-only, memory-mapped Wave file together with its chunk index.
+
+    Only the pages that are actually touched are read from disk, so opening a multi-gigabyte file costs no more
+    than reading its headers. Intended to be used as a context manager::
+
+        with WaveFile("foo.wav") as wave:
+            bext = wave.read(wave.find("bext"))
+
+    Attributes:
+        filename (str): The name of the file.
+        stat (os.stat_result): The result of fstat() on the open file.
+        form (str): "RIFF", "RF64" or "BW64".
+        chunks (list): Chunk objects in file order.
+        nopadding (bool): True if at least one odd-sized chunk lacks its pad byte.
+        errors (list): Structural errors found while walking the chunk list.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        recovery_error = None
+        try:
+            recover(filename)
+        except OSError as e:
+            recovery_error = "an interrupted write could not be rolled back ({})".format(e)
+        self._file = open(filename, "rb")
+        self.map = None
+        try:
+            self.stat = os.fstat(self._file.fileno())
+            if self.stat.st_size < 12:
+                raise NotWaveError("not a RIFF/WAVE file")
+            self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.form, self.chunks, self.nopadding, self.errors = walk_chunks(self.map)
+            if recovery_error is not None:
+                self.errors.insert(0, recovery_error)
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self._file.close()
+
+    def find(self, chunk_id, list_type=None):
+        """Return the first chunk with the given identifier (and LIST type, if given), or None."""
+        for chunk in self.chunks:
+            if chunk.id == chunk_id and (list_type is None or chunk.list_type == list_type):
+                return chunk
+        return None
+
+    def read(self, chunk):
+        """Return the data of a chunk as bytes."""
+        return self.map[chunk.offset:chunk.offset + chunk.size]
+
+    def iter_data(self, block_size=1 << 24):
+        """Yield the contents of the data chunk in successive blocks.
+
+        Only one block at a time is paged in from the memory map, so memory use is bounded by block_size no matter
+        how large the data chunk is.
+
+        Args:
+            block_size (int): The size of each block in bytes.
+        """
+        chunk = self.find("data")
+        if chunk is None:
+            return
+        end = chunk.offset + chunk.size
+        for start in range(chunk.offset, end, block_size):
+            yield self.map[start:min(start + block_size, end)]
+
+
+def _decode_text(raw):
+    """Decode a NUL-terminated (or NUL-padded) text field, trying UTF-8 before falling back to ISO-8859-1."""
+    raw = raw.split(b"\x00", 1)[0]
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+def format_time(samples, sample_rate):
+    """Convert a sample count to the "HH:MM:SS.mmm" form used by bwfmetaedit for times and durations."""
+    if not sample_rate:
+        return ""
+    milliseconds = samples * 1000 // sample_rate
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return "{:02d}:{:02d}:{:02d}.{:03d}".format(hours, minutes, seconds, milliseconds)
+
+
+def decode_bext(data, sample_rate=0):
+    """Decode the contents of a bext chunk.
+
+    Args:
+        data (bytes): The bext chunk data.
+        sample_rate (int): Sample rate from the fmt chunk, used to translate TimeReference. May be 0 if unknown.
+
+    Returns:
+        dict: Metadata values indexed by bwfmetaedit core field name.
+    """
+
+    data = data.ljust(_BEXT_FIXED_SIZE, b"\x00")
+    md = {}
+    pos = 0
+    for field, size in _BEXT_LAYOUT:
+        md[field] = _decode_text(data[pos:pos + size])
+        pos += size
+
+    time_reference, version = struct.unpack_from("<QH", data, 338)
+    md["TimeReference"] = str(time_reference)
+    md["TimeReference (translated)"] = format_time(time_reference, sample_rate)
+    md["BextVersion"] = str(version)
+
+    umid = data[348:412]
+    md["UMID"] = umid.hex().upper() if version >= 1 and any(umid) else ""
+
+    loudness_fields = ["LoudnessValue", "LoudnessRange", "MaxTruePeakLevel", "MaxMomentaryLoudness",
+                       "MaxShortTermLoudness"]
+    loudness = struct.unpack_from("<5h", data, 412)
+    for field, value in zip(loudness_fields, loudness):
+        md[field] = "{:.2f}".format(value / 100) if version >= 2 else ""
+
+    md["CodingHistory"] = _decode_text(data[_BEXT_FIXED_SIZE:])
+    return md
+
+
+def decode_fmt(data):
+    """Decode the contents of a fmt chunk.
+
+    Both plain PCM (WAVEFORMAT/WAVEFORMATEX) and WAVE_FORMAT_EXTENSIBLE layouts are understood. For the latter,
+    the codec is taken from the first two bytes of the SubFormat GUID.
+
+    Args:
+        data (bytes): The fmt chunk data.
+
+    Returns:
+        dict: With the integer values "FormatTag", "Channels", "SampleRate", "ByteRate", "BlockAlign" and
+            "BitPerSample".
+
+    Raises:
+        NotWaveError: If the chunk is too short to be a fmt chunk.
+    """
+
+    if len(data) < 14:
+        raise NotWaveError("fmt chunk is too short")
+    format_tag, channels, sample_rate, byte_rate, block_align = struct.unpack_from("<HHIIH", data)
+    bits = struct.unpack_from("<H", data, 14)[0] if len(data) >= 16 else 0
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(data) >= 26:
+        format_tag = struct.unpack_from("<H", data, 24)[0]
+    return {"FormatTag": format_tag, "Channels": channels, "SampleRate": sample_rate, "ByteRate": byte_rate,
+            "BlockAlign": block_align, "BitPerSample": bits}
+
+
+def decode_tech(fmt, data_size, chunks, errors, form="RIFF"):
+    """Construct bwfmetaedit-style technical metadata from the fmt chunk and the data chunk size.
+
+    Args:
+        fmt (dict): Decoded fmt chunk, as returned by decode_fmt(), or None if there is no fmt chunk.
+        data_size (int): Size of the data chunk in bytes.
+        chunks (list): The Chunk objects of the file.
+        errors (list): Structural errors found while walking the chunk list.
+        form (str): The form type of the file ("RIFF", "RF64" or "BW64").
+
+    Returns:
+        dict: Metadata values indexed by bwfmetaedit tech field name. FileName, FileSize, DateCreated,
+            DateModified, MD5Stored, MD5Generated and Information are left empty for the caller to fill in.
+    """
+
+    md = {field: "" for field in TECH_FIELDS}
+    md["Format"] = "Wave" if form == "RIFF" else "Wave ({})".format(form)
+    if fmt is not None:
+        md["CodecID"] = "{:04X}".format(fmt["FormatTag"])
+        md["Channels"] = str(fmt["Channels"])
+        md["SampleRate"] = str(fmt["SampleRate"])
+        md["BitRate"] = str(fmt["ByteRate"] * 8)
+        md["BitPerSample"] = str(fmt["BitPerSample"])
+        if fmt["BlockAlign"]:
+            md["Duration"] = format_time(data_size // fmt["BlockAlign"], fmt["SampleRate"])
+
+    ids = [chunk.id for chunk in chunks]
+    md["UnsupportedChunks"] = " ".join(i for i in ids if i not in _SUPPORTED_CHUNKS)
+    md["bext"] = "Yes" if "bext" in ids else ""
+    md["INFO"] = "Yes" if any(chunk.list_type == "INFO" for chunk in chunks) else ""
+    md["XMP"] = "Yes" if "_PMX" in ids else ""
+    md["aXML"] = "Yes" if "aXML" in ids else ""
+    md["iXML"] = "Yes" if "iXML" in ids else ""
+    md["Errors"] = "; ".join(errors)
+    return md
+
+
+def decode_info(data):
+    """Decode the contents of a LIST/INFO chunk.
+
+    Args:
+        data (bytes): The LIST chunk data, starting with the "INFO" list type.
+
+    Returns:
+        dict: Text values indexed by four-character INFO identifier.
+    """
+
+    md = {}
+    pos = 4
+    while pos + 8 <= len(data):
+        ckid, size = struct.unpack_from("<4sI", data, pos)
+        if not _is_chunk_id(ckid):
+            break
+        md[ckid.decode("ascii")] = _decode_text(data[pos + 8:pos + 8 + size])
+        pos += 8 + size + (size % 2)
+    return md
+
+
+def read_metadata(filename):
+    """Read the metadata chunks of a Wave file in a single pass over its chunk list.
+
+    Args:
+        filename (str): The name of the Wave file.
+
+    Returns:
+        dict: With the keys "core" (dict of bwfmetaedit core fields, empty strings if absent), "tech" (dict of
+            bwfmetaedit technical fields, computed from the chunk headers only), "xmp" (the raw XMP
+            packet as bytes, or None if there is no _PMX chunk), "MD5Stored" (lowercase hex string, empty if there
+            is no MD5 chunk), "form" (str), "chunks" (list of Chunk objects), "nopadding" (bool) and "errors" (list
+            of str).
+
+    Raises:
+        NotWaveError: If the file is not a RIFF/WAVE, RF64 or BW64 file.
+    """
+
+    from datetime import datetime
+
+    with WaveFile(filename) as wave:
+        stat = wave.stat
+        chunks = wave.chunks
+        errors = list(wave.errors)
+
+        core = {field: "" for field in CORE_FIELDS}
+        core["FileName"] = filename
+        xmp = None
+        md5 = ""
+        fmt = None
+        data_size = 0
+        bext = None
+
+        for chunk in chunks:
+            if chunk.id == "fmt " and fmt is None:
+                try:
+                    fmt = decode_fmt(wave.read(chunk))
+                except NotWaveError as e:
+                    errors.append(str(e))
+            elif chunk.id == "data":
+                data_size = chunk.size
+            elif chunk.id == "bext":
+                bext = wave.read(chunk)
+            elif chunk.id == "LIST" and chunk.list_type == "INFO":
+                info = decode_info(wave.read(chunk))
+                core.update({k: v for k, v in info.items() if k in INFO_FIELDS})
+            elif chunk.id == "_PMX":
+                xmp = wave.read(chunk).rstrip(b"\x00")
+            elif chunk.id == "MD5 " and chunk.size >= 16:
+                md5 = wave.read(chunk)[:16].hex()
+
+        if bext is not None:
+            core.update(decode_bext(bext, fmt["SampleRate"] if fmt else 0))
+
+    tech = decode_tech(fmt, data_size, chunks, errors, wave.form)
+    tech["FileName"] = filename
+    tech["FileSize"] = str(stat.st_size)
+    tech["DateCreated"] = datetime.fromtimestamp(stat.st_ctime).strftime("%Y-%m-%d %H:%M:%S")
+    tech["DateModified"] = datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+    tech["MD5Stored"] = md5
+
+    return {"core": core, "tech": tech, "xmp": xmp, "MD5Stored": md5, "form": wave.form, "chunks": chunks,
+            "nopadding": wave.nopadding, "errors": errors}
+
+
+def encode_bext(md, original=None):
+    """Encode the contents of a bext chunk.
+
+    Args:
+        md (dict): Values of the bext fields (Description, Originator, OriginatorReference, OriginationDate,
+            OriginationTime, TimeReference and CodingHistory) to be stored. Fields that are not in md keep their
+            values from original.
+        original (bytes): The existing bext chunk data, or None if the file does not have a bext chunk yet.
+
+    Returns:
+        bytes: The new bext chunk data.
+
+    Raises:
+        WriteError: If a value does not fit into its fixed-length field.
+    """
+
+    data = bytearray((original or b"")[:_BEXT_FIXED_SIZE].ljust(_BEXT_FIXED_SIZE, b"\x00"))
+    pos = 0
+    for field, size in _BEXT_LAYOUT:
+        if field in md:
+            value = md[field].encode("utf-8")
+            if len(value) > size:
+                raise WriteError("{} is longer than {} bytes".format(field, size))
+            data[pos:pos + size] = value.ljust(size, b"\x00")
+        pos += size
+
+    if "TimeReference" in md:
+        struct.pack_into("<Q", data, 338, int(md["TimeReference"] or 0))
+    if original is None:
+        struct.pack_into("<H", data, 346, 1)
+
+    if "CodingHistory" in md:
+        history = md["CodingHistory"].encode("utf-8")
+    else:
+        history = (original or b"")[_BEXT_FIXED_SIZE:]
+    return bytes(data) + history
+
+
+def encode_info(md, original=None):
+    """Encode the contents of a LIST/INFO chunk.
+
+    Args:
+        md (dict): Text values to be stored, indexed by four-character INFO identifier. An empty string removes the
+            field. Fields that are not in md are copied unchanged from original.
+        original (bytes): The existing LIST/INFO chunk data, or None if the file does not have one yet.
+
+    Returns:
+        bytes: The new LIST chunk data (starting with the "INFO" list type), or None if no fields remain.
+    """
+
+    fields = {}
+    pos = 4
+    while original and pos + 8 <= len(original):
+        ckid, size = struct.unpack_from("<4sI", original, pos)
+        if not _is_chunk_id(ckid):
+            break
+        fields[ckid.decode("ascii")] = original[pos + 8:pos + 8 + size]
+        pos += 8 + size + (size % 2)
+
+    for ckid, value in md.items():
+        fields[ckid] = value.encode("utf-8") + b"\x00" if value != "" else b""
+
+    data = bytearray(b"INFO")
+    for ckid, value in fields.items():
+        if value.rstrip(b"\x00") == b"":
+            continue
+        data += struct.pack("<4sI", ckid.encode("ascii"), len(value)) + value + b"\x00" * (len(value) % 2)
+    return bytes(data) if len(data) > 4 else None
+
+
+def _filler(size):
+    """Return a JUNK chunk occupying exactly size (>= 8) bytes, including its header.
+
+    An odd-sized slot only occurs in a file that already lacks pad bytes, so the JUNK chunk then declares an odd
+    size and is not padded either, which keeps the following chunk where the chunk walker expects it.
+    """
+    return struct.pack("<4sI", b"JUNK", size - 8) + b"\x00" * (size - 8)
+
+
+def _stretch(chunk_id, data, size):
+    """Lengthen chunk data to size bytes with trailing NULs, keeping it decodable.
+
+    For LIST chunks the NULs are absorbed by the last sub-chunk, whose (NUL-terminated) text is unaffected.
+    """
+    extra = size - len(data)
+    last = None
+    pos = 4
+    while chunk_id == "LIST" and pos + 8 <= len(data):
+        last = pos
+        pos += 8 + struct.unpack_from("<I", data, pos + 4)[0]
+        pos += pos % 2
+    data = bytearray(data + b"\x00" * extra)
+    if last is not None:
+        struct.pack_into("<I", data, last + 4, size - last - 8)
+    return bytes(data)
+
+
+def _layout(chunk_id, data, space):
+    """Lay out a chunk (header, data and pad byte) in a slot of space bytes.
+
+    Any space left over is filled with a JUNK chunk or, if there is too little room for a chunk header, absorbed
+    into the chunk data itself.
+
+    Args:
+        chunk_id (str): The chunk identifier.
+        data (bytes): The chunk data, or None to turn the whole slot into filler.
+        space (int): The size of the slot, or None if the slot is at the end of the file and may grow.
+
+    Returns:
+        bytes: The bytes to be written at the start of the slot, or None if the chunk does not fit.
+    """
+    if data is None:
+        return _filler(space) if space is not None else b""
+    block = struct.pack("<4sI", chunk_id.encode("ascii"), len(data)) + data + b"\x00" * (len(data) % 2)
+    if space is None or len(block) == space:
+        return block
+    if len(block) > space:
+        return None
+    if space - len(block) >= 8:
+        return block + _filler(space - len(block))
+    data = _stretch(chunk_id, data, space - 8)
+    return struct.pack("<4sI", chunk_id.encode("ascii"), len(data)) + data
+
+
+def _chunk_key(chunk):
+    return chunk.id, chunk.list_type if chunk.id == "LIST" else None
+
+
+def _plan_in_place(wave, replacements):
+    """Work out how to write the replacement chunks without moving any other chunk.
+
+    The chunks that replace existing ones are placed first, so that the final size of the file is known before any
+    new chunk is appended to it.
+
+    Returns:
+        tuple: A list of (offset, bytes) writes and the new size of the file, or None if at least one chunk does
+            not fit into the space available to it.
+    """
+
+    size = wave.stat.st_size
+    ends = [chunk.offset - 8 for chunk in wave.chunks[1:]] + [size]
+    keys = [_chunk_key(chunk) for chunk in wave.chunks]
+    data_index = keys.index(("data", None)) if ("data", None) in keys else len(keys)
+    used = set()
+    writes = []
+    new_size = size
+    appended = False
+
+    def slot(index):
+        start = wave.chunks[index].offset - 8
+        end = ends[index]
+        used.add(index)
+        for following in range(index + 1, len(wave.chunks)):
+            if wave.chunks[following].id not in _FILLER_CHUNKS or following in used:
+                break
+            used.add(following)
+            end = ends[following]
+        # the slot at the end of the file may only grow (or shrink) while nothing has been appended behind it
+        return start, (end if end < size or appended else None)
+
+    existing = [key for key in replacements if key in keys]
+    new = [key for key in replacements if key not in keys and replacements[key] is not None]
+    for key in existing + new:
+        data = replacements[key]
+        if key in keys:
+            start, end = slot(keys.index(key))
+        else:
+            needed = 8 + len(data) + len(data) % 2
+            # readers expect the leading chunks before the data chunk, so only fillers in front of it will do
+            candidates = range(data_index) if key[0] in _LEADING_CHUNKS else range(len(keys))
+            fillers = [i for i in candidates if wave.chunks[i].id in _FILLER_CHUNKS and i not in used
+                       and ends[i] - wave.chunks[i].offset + 8 >= needed]
+            if fillers:
+                start, end = slot(fillers[0])
+            elif key[0] in _LEADING_CHUNKS:
+                return None
+            else:
+                start, end = new_size + new_size % 2, None
+                if new_size % 2:
+                    writes.append((new_size, b"\x00"))
+                appended = True
+
+        block = _layout(key[0], data, end - start if end is not None else None)
+        if block is None:
+            return None
+        writes.append((start, block))
+        if end is None:
+            new_size = start + len(block)
+
+    return writes, new_size
+
+
+def _size_fields(wave, new_size, ds64_offset=None):
+    """Return the (offset, bytes) writes that record new_size as the RIFF size of the file."""
+    if wave.form == "RIFF":
+        if new_size - 8 > _RF64_PLACEHOLDER:
+            raise WriteError("file would exceed the 4 GB limit of a RIFF file")
+        return [(4, struct.pack("<I", new_size - 8))]
+    if ds64_offset is None:
+        ds64_offset = wave.find("ds64").offset
+    return [(ds64_offset, struct.pack("<Q", new_size - 8))]
+
+
+def _journal_path(filename, create=False):
+    import hashlib
+    from appdirs import AppDirs
+
+    directory = os.path.join(AppDirs("autoBWF", "UHEC").user_data_dir, "journal")
+    if create:
+        os.makedirs(directory, exist_ok=True)
+    name = hashlib.sha1(os.path.realpath(filename).encode("utf-8")).hexdigest()
+    return os.path.join(directory, name + ".json")
+
+
+def _lock(f, blocking=True):
+    """Take an exclusive lock on an open journal file, returning False if it is held by another writer.
+
+    Where file locks are not available, this always succeeds.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _fsync_directory(directory):
+    """Make the creation or removal of a file in directory durable (where the OS supports it)."""
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def recover(filename):
+    """Undo an in-place write to filename that was interrupted (e.g. by a crash or power failure).
+
+    Before writing in place, the bytes about to be overwritten are saved to a journal outside of the archive
+    directory, which the writer keeps locked until the write is complete and the journal removed. If a journal
+    exists that is not locked, the write did not complete and the original bytes are restored. This is done
+    whenever a WaveFile is opened, so neither readers nor writers are left with a half-written file.
+
+    Returns:
+        bool: True if an interrupted write was rolled back.
+
+    Raises:
+        OSError: If the file cannot be restored (e.g. because it is read-only).
+    """
+
+    import json
+
+    journal = _journal_path(filename)
+    try:
+        f = open(journal)
+    except FileNotFoundError:
+        return False
+    with f:
+        # a journal that is locked belongs to a write in progress, and one that has no links left was removed by
+        # a writer that completed while we waited to open it
+        if not _lock(f, blocking=False) or os.fstat(f.fileno()).st_nlink == 0:
+            return False
+        try:
+            entry = json.load(f)
+        except ValueError:
+            # the journal itself was not completely written, so the file was not touched yet
+            entry = None
+
+        if entry is not None:
+            with open(filename, "r+b") as wav:
+                for offset, original in entry["regions"]:
+                    wav.seek(offset)
+                    wav.write(bytes.fromhex(original))
+                wav.truncate(entry["size"])
+                wav.flush()
+                os.fsync(wav.fileno())
+        if os.name != "nt":
+            _remove(journal)
+    # open files cannot be removed on Windows
+    _remove(journal)
+    _fsync_directory(os.path.dirname(journal))
+    return entry is not None
+
+
+def _write_in_place(filename, writes, old_size, new_size):
+    """Apply writes to filename, journaling the bytes they overwrite (see recover()).
+
+    The journal is written and synced under a temporary name while locked, and only then linked into place, so that
+    recover() never sees an incomplete journal.
+
+    Raises:
+        WriteError: If another write to the same file is in progress.
+    """
+    import json
+    import tempfile
+
+    journal = _journal_path(filename, create=True)
+    directory = os.path.dirname(journal)
+    fd, temp_name = tempfile.mkstemp(prefix=os.path.basename(journal) + ".", suffix=".tmp", dir=directory)
+    try:
+        with open(fd, "w") as j:
+            _lock(j)
+            regions = []
+            with open(filename, "r+b") as f:
+                for offset, block in writes:
+                    f.seek(offset)
+                    regions.append([offset, f.read(len(block)).hex()])
+            json.dump({"file": os.path.realpath(filename), "size": old_size, "regions": regions}, j)
+            j.flush()
+            os.fsync(j.fileno())
+            try:
+                os.link(temp_name, journal)
+            except FileExistsError:
+                raise WriteError("another write to {} is in progress".format(filename))
+            if os.name != "nt":
+                os.remove(temp_name)
+            _fsync_directory(directory)
+
+            with open(filename, "r+b") as f:
+                for offset, block in writes:
+                    f.seek(offset)
+                    f.write(block)
+                if new_size < old_size:
+                    f.truncate(new_size)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.name != "nt":
+                # removed while still locked, so that no reader can mistake it for the journal of an interrupted
+                # write
+                _remove(journal)
+    finally:
+        # open files cannot be removed on Windows
+        _remove(temp_name)
+    _remove(journal)
+    _fsync_directory(directory)
+
+
+def _remove(filename):
+    """Remove a file if it still exists."""
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+
+def _rewrite(wave, replacements):
+    """Write a new copy of the file with the replacement chunks and atomically move it over the original.
+
+    Chunks that are not yet in the file are inserted just before the data chunk.
+    """
+
+    import shutil
+    import tempfile
+
+    directory, name = os.path.split(os.path.realpath(wave.filename))
+    fd, temp_name = tempfile.mkstemp(prefix="." + name + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(wave.map[0:12])
+            pending = dict(replacements)
+            keys = [_chunk_key(chunk) for chunk in wave.chunks]
+            ds64_offset = None
+
+            for chunk, key in zip(wave.chunks, keys):
+                if chunk.id == "data":
+                    for new_key in [k for k in pending if k not in keys]:
+                        data = pending.pop(new_key)
+                        if data is not None:
+                            out.write(_layout(new_key[0], data, None))
+                if key in pending:
+                    data = pending.pop(key)
+                    if data is not None:
+                        out.write(_layout(chunk.id, data, None))
+                    continue
+
+                if chunk.id == "ds64":
+                    ds64_offset = out.tell() + 8
+                out.write(wave.map[chunk.offset - 8:chunk.offset])
+                for start in range(chunk.offset, chunk.offset + chunk.size, 1 << 24):
+                    out.write(wave.map[start:min(start + (1 << 24), chunk.offset + chunk.size)])
+                if chunk.size % 2:
+                    out.write(b"\x00")
+
+            for data_key, data in pending.items():
+                if data is not None:
+                    out.write(_layout(data_key[0], data, None))
+
+            for offset, block in _size_fields(wave, out.tell(), ds64_offset):
+                out.seek(offset)
+                out.write(block)
+            out.flush()
+            os.fsync(out.fileno())
+
+        shutil.copymode(wave.filename, temp_name)
+        os.replace(temp_name, wave.filename)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
+
+
+def write_chunks(filename, replacements, accept_nopadding=False):
+    """Replace, add or remove chunks of a Wave file, rewriting the file only if unavoidable.
+
+    Each new chunk is written into the space of the chunk it replaces together with any filler (JUNK, PAD, FLLR)
+    chunks that directly follow it. New chunks may also take over a free filler chunk, or (except for bext) be
+    appended to the end of the file. Leftover space is turned into a JUNK chunk. The original bytes are journaled
+    (see recover()) before anything is overwritten, so an interrupted in-place write can be rolled back.
+
+    If any chunk does not fit, the whole file is instead rewritten once to a temporary file in the same directory,
+    which then atomically replaces the original.
+
+    Args:
+        filename (str): The name of the Wave file.
+        replacements (dict): New chunk data indexed by (chunk id, LIST type) tuples, e.g. ("bext", None) or
+            ("LIST", "INFO"). A value of None removes the chunk.
+        accept_nopadding (bool): If False, refuse to modify files in which an odd-sized chunk is not followed by a
+            pad byte, mirroring the behavior of bwfmetaedit without "--accept-nopadding".
+
+    Returns:
+        bool: True if the file was updated in place, False if it was rewritten.
+
+    Raises:
+        WriteError: If the file cannot be modified.
+        NotWaveError: If the file is not a RIFF/WAVE, RF64 or BW64 file.
+    """
+
+    with WaveFile(filename) as wave:
+        if wave.errors:
+            raise WriteError("; ".join(wave.errors))
+        if wave.nopadding and not accept_nopadding:
+            raise WriteError("odd-sized chunk without padding byte (see the accept-nopadding configuration)")
+
+        plan = _plan_in_place(wave, replacements)
+        if plan is None:
+            _rewrite(wave, replacements)
+            return False
+
+        writes, new_size = plan
+        if new_size != wave.stat.st_size:
+            writes.extend(_size_fields(wave, new_size))
+        old_size = wave.stat.st_size
+
+    _write_in_place(filename, writes, old_size, new_size)
+    return True
+
+
+def write_metadata(filename, md, xmp=None, md5_embed=False, accept_nopadding=False):
+    """Write bext, LIST/INFO, _PMX and MD5 chunks to a Wave file in a single pass.
+
+    Args:
+        filename (str): The name of the Wave file.
+        md (dict): New values indexed by bwfmetaedit core field name (e.g. "Description", "TimeReference", "INAM").
+            Fields that are not in md are left unchanged; INFO fields set to an empty string are removed.
+        xmp (bytes): New XMP packet for the _PMX chunk, or None to leave it unchanged.
+        md5_embed (bool): If True, store the MD5 digest of the data chunk in the MD5 chunk.
+        accept_nopadding (bool): See write_chunks().
+
+    Returns:
+        bool: True if the file was updated in place, False if it was rewritten.
+    """
+
+    import hashlib
+
+    replacements = {}
+    with WaveFile(filename) as wave:
+        bext_md = {k: v for k, v in md.items() if k in _BEXT_FIELDS}
+        if bext_md:
+            bext = wave.find("bext")
+            replacements[("bext", None)] = encode_bext(bext_md, wave.read(bext) if bext else None)
+
+        info_md = {k: v for k, v in md.items() if k in INFO_FIELDS}
+        if info_md:
+            info = wave.find("LIST", "INFO")
+            replacements[("LIST", "INFO")] = encode_info(info_md, wave.read(info) if info else None)
+
+        if xmp is not None:
+            replacements[("_PMX", None)] = xmp
+
+        if md5_embed:
+            digest = hashlib.md5()
+            for block in wave.iter_data():
+                digest.update(block)
+            replacements[("MD5 ", None)] = digest.digest()
+
+    if not replacements:
+        return True
+    return write_chunks(filename, replacements, accept_nopadding)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,452 @@
+"""Compute and verify digests of BWF files natively.
+
+The data chunk is located with the chunk parser of autoBWF.BWFchunks and then read sequentially with readinto() into
+a single large, page-aligned, reused buffer, so that no memory is allocated per block. Digests of the data chunk and
+of the whole file (with any hashlib algorithms) are computed from a single read of the file. hashlib releases the
+GIL while it hashes large blocks, so several files can be hashed concurrently by a thread pool, which is how a disk
+array is kept busy.
+
+Computed digests can be stored with the file, in "user.autobwf.<scope>.<algorithm>" extended attributes (e.g.
+"user.autobwf.data.md5"), each recording the size and modification time of the file at the time. On filesystems
+without extended attributes they are stored in an autoBWF.BWFcache.MetadataCache instead. cached_digests() reuses
+them as long as the file is unchanged.
+
+For a quick daily triage of a large archive, fingerprint() hashes the chunk table, the metadata chunks and a few
+deterministically chosen blocks of the data chunk, which costs a small, fixed amount of reading per file.
+
+MD5 (as embedded in the MD5 chunk) can only be computed serially. A tree digest, computed by tree_digest(), instead
+has one BLAKE2b leaf digest per fixed-size block of the data chunk, so that the leaves of a single large file can be
+hashed (and verified) on all cores, and damage can be located to the blocks whose leaves differ. Tree digests are
+stored in a JSON sidecar file next to the Wave file (see write_tree()), which leaves the file itself untouched.
+
+Attributes:
+    block_size (int): Size in bytes of the read buffer (a multiple of the memory page size).
+    sample_size (int): Size in bytes of each block of the data chunk sampled by fingerprint().
+    tree_leaf_size (int): Default size in bytes of the blocks of the data chunk covered by each leaf of a tree digest.
+"""
+
+import hashlib
+import mmap
+import os
+import threading
+import time
+
+from autoBWF import BWFchunks
+
+block_size = 1 << 24
+sample_size = 1 << 16
+tree_leaf_size = 1 << 24
+
+
+class Throttle:
+    """Limits the average rate at which files are read, by sleeping as needed after each block.
+
+    A single Throttle can be shared by all the files (and threads) of a run, so that the limit applies to the run
+    as a whole.
+
+    Args:
+        rate (float): The maximum rate in bytes per second.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.start = time.monotonic()
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, nbytes):
+        with self._lock:
+            self.total += nbytes
+            delay = self.total / self.rate - (time.monotonic() - self.start)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _data_range(filename):
+    """Return the offset and the size of the data chunk of a Wave file, or None if there is no data chunk.
+
+    The size is clipped to the end of the file, so that a truncated data chunk is hashed as far as it goes.
+    """
+
+    with BWFchunks.WaveFile(filename) as wave:
+        chunk = wave.find("data")
+        if chunk is None:
+            return None
+        return chunk.offset, min(chunk.size, wave.stat.st_size - chunk.offset)
+
+
+def file_digests(filename, data_algorithms=("md5",), file_algorithms=(), throttle=None):
+    """Compute digests of the data chunk and of the whole file in a single pass.
+
+    If no whole-file digests are requested, only the data chunk is read.
+
+    Args:
+        filename (str): The name of the Wave file.
+        data_algorithms (list): Names of the hashlib algorithms (e.g. "md5", "sha256") applied to the data chunk.
+        file_algorithms (list): Names of the hashlib algorithms applied to the whole file.
+        throttle (Throttle): If not None, called with the size of each block read.
+
+    Returns:
+        dict: With the keys "data" and "file", each a dict of lowercase hex digests indexed by algorithm name. The
+            data chunk digests are empty strings if there is no data chunk.
+
+    Raises:
+        BWFchunks.NotWaveError: If filename is not a RIFF/WAVE file.
+    """
+
+    data = _data_range(filename) if data_algorithms else None
+    data_hashes = {name: hashlib.new(name) for name in data_algorithms} if data is not None else {}
+    file_hashes = {name: hashlib.new(name) for name in file_algorithms}
+
+    if file_hashes:
+        start = 0
+        size = os.path.getsize(filename)
+    elif data is not None:
+        start, size = data
+    else:
+        start = size = 0
+    data_start, data_end = (data[0], data[0] + data[1]) if data is not None else (0, 0)
+
+    buffer = mmap.mmap(-1, block_size)
+    view = memoryview(buffer)
+    try:
+        with open(filename, "rb", buffering=0) as f:
+            f.seek(start)
+            position, end = start, start + size
+            while position < end:
+                n = f.readinto(view[:min(block_size, end - position)])
+                if not n:
+                    break
+                block = view[:n]
+                for digest in file_hashes.values():
+                    digest.update(block)
+                lo, hi = max(position, data_start), min(position + n, data_end)
+                if lo < hi:
+                    for digest in data_hashes.values():
+                        digest.update(block[lo - position:hi - position])
+                block.release()
+                position += n
+                if throttle is not None:
+                    throttle(n)
+    finally:
+        view.release()
+        buffer.close()
+
+    return {"data": {name: data_hashes[name].hexdigest() if name in data_hashes else "" for name in data_algorithms},
+            "file": {name: digest.hexdigest() for name, digest in file_hashes.items()}}
+
+
+def data_md5(filename):
+    """Compute the MD5 digest of the data chunk of a Wave file, as stored in the MD5 chunk.
+
+    Args:
+        filename (str): The name of the Wave file.
+
+    Returns:
+        str: The digest as a lowercase hex string, or an empty string if there is no data chunk.
+
+    Raises:
+        BWFchunks.NotWaveError: If filename is not a RIFF/WAVE file.
+    """
+
+    return file_digests(filename)["data"]["md5"]
+
+
+def _sample_ranges(offset, size, samples):
+    """Return the (start, end) file offsets of the first, the last and samples pseudo-random blocks of the data chunk
+    at offset with the given size. The positions depend only on the size of the data chunk."""
+    import random
+
+    rng = random.Random(size)
+    last = max(size - sample_size, 0)
+    offsets = [0, last] + [rng.randint(0, last) for _ in range(samples)]
+    return [(offset + start, offset + min(start + sample_size, size)) for start in offsets]
+
+
+def fingerprint(filename, samples=8, throttle=None):
+    """Compute a quick fingerprint of a Wave file from its structure and a sample of its audio data.
+
+    The fingerprint is a BLAKE2b digest of the form type and chunk table (identifiers, offsets and sizes), of the
+    contents of all chunks other than the data chunk, and of the first and last blocks of the data chunk together
+    with samples pseudo-random blocks of it. The positions of the blocks depend only on the size of the data chunk,
+    so the fingerprint of an unchanged file is always the same, while a change to its metadata or to its size, a
+    truncation, or damage to a sampled block changes it. It is not a substitute for a full digest, but it can be
+    used to decide which files need one most urgently.
+
+    Args:
+        filename (str): The name of the Wave file.
+        samples (int): The number of pseudo-random blocks of the data chunk (of sample_size bytes) to include.
+        throttle (Throttle): If not None, called with the number of bytes read.
+
+    Returns:
+        str: The fingerprint as a lowercase hex string.
+
+    Raises:
+        BWFchunks.NotWaveError: If filename is not a RIFF/WAVE file.
+    """
+
+    fp = hashlib.blake2b(digest_size=16)
+    with BWFchunks.WaveFile(filename) as wave:
+        file_size = wave.stat.st_size
+        fp.update("{} {}\n".format(wave.form, file_size).encode("ascii"))
+        for chunk in wave.chunks:
+            fp.update("{} {} {}\n".format(chunk.id, chunk.offset, chunk.size).encode("ascii"))
+
+        for chunk in wave.chunks:
+            end = min(chunk.offset + chunk.size, file_size)
+            if chunk.id == "data":
+                ranges = _sample_ranges(chunk.offset, end - chunk.offset, samples)
+            else:
+                ranges = [(chunk.offset, end)]
+            for start, stop in ranges:
+                fp.update(wave.map[start:stop])
+                if throttle is not None:
+                    throttle(stop - start)
+    return fp.hexdigest()
+
+
+def sampled_data_digest(filename, samples=8):
+    """Compute a digest of the same blocks of the data chunk as fingerprint(), but of nothing else.
+
+    Files with the same audio data have the same sampled digest, whatever their metadata, so that it can be used to
+    rule out most of the files that cannot be duplicates without reading them in full.
+
+    Args:
+        filename (str): The name of the Wave file.
+        samples (int): The number of pseudo-random blocks of the data chunk to include.
+
+    Returns:
+        str: The digest as a lowercase hex string, or an empty string if there is no data chunk.
+
+    Raises:
+        BWFchunks.NotWaveError: If filename is not a RIFF/WAVE file.
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    with BWFchunks.WaveFile(filename) as wave:
+        chunk = wave.find("data")
+        if chunk is None:
+            return ""
+        for start, stop in _sample_ranges(chunk.offset, min(chunk.size, wave.stat.st_size - chunk.offset), samples):
+            digest.update(wave.map[start:stop])
+    return digest.hexdigest()
+
+
+def tree_digest(filename, leaf_size=None, jobs=0, throttle=None):
+    """Compute the tree digest of the data chunk of a Wave file, hashing up to jobs blocks at the same time.
+
+    Args:
+        filename (str): The name of the Wave file.
+        leaf_size (int): The size of the block covered by each leaf (by default, tree_leaf_size).
+        jobs (int): Number of blocks hashed concurrently (see autoBWF.batch.job_count(); 0 for one per CPU).
+        throttle (Throttle): If not None, called with the size of each block read.
+
+    Returns:
+        dict: With the keys "algorithm" ("blake2b"), "leaf_size", "data_size", "leaves" (a list of lowercase hex
+            leaf digests, one per block) and "root" (the digest of the concatenated leaf digests).
+
+    Raises:
+        BWFchunks.NotWaveError: If filename is not a RIFF/WAVE file.
+        ValueError: If the file has no data chunk.
+    """
+
+    from autoBWF.batch import imap
+
+    leaf_size = leaf_size or tree_leaf_size
+    data = _data_range(filename)
+    if data is None:
+        raise ValueError("{} has no data chunk".format(filename))
+    offset, size = data
+
+    def leaf(index):
+        start = index * leaf_size
+        buffer = bytearray(min(leaf_size, size - start))
+        with open(filename, "rb", buffering=0) as f:
+            f.seek(offset + start)
+            n = f.readinto(buffer)
+        if throttle is not None:
+            throttle(n)
+        return hashlib.blake2b(memoryview(buffer)[:n]).digest()
+
+    leaves = []
+    for index, digest, error in imap(leaf, range((size + leaf_size - 1) // leaf_size), jobs):
+        if error is not None:
+            raise error
+        leaves.append(digest)
+
+    return {"algorithm": "blake2b", "leaf_size": leaf_size, "data_size": size,
+            "leaves": [digest.hex() for digest in leaves], "root": hashlib.blake2b(b"".join(leaves)).hexdigest()}
+
+
+def tree_file(filename):
+    """Return the name of the sidecar file holding the tree digest of filename."""
+    return filename + ".tree.json"
+
+
+def write_tree(filename, tree):
+    """Store a tree digest (as returned by tree_digest()) in the sidecar file of filename."""
+    import json
+
+    with open(tree_file(filename), "w") as f:
+        json.dump(tree, f, indent=1)
+
+
+def read_tree(filename):
+    """Return the tree digest stored in the sidecar file of filename, or None if there is none."""
+    import json
+
+    try:
+        with open(tree_file(filename)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def verify_tree(filename, tree=None, jobs=0, throttle=None):
+    """Verify the data chunk of a Wave file against its tree digest, and locate any damage.
+
+    Args:
+        filename (str): The name of the Wave file.
+        tree (dict): The tree digest, by default the one stored by write_tree().
+        jobs (int): Number of blocks hashed concurrently (see autoBWF.batch.job_count(); 0 for one per CPU).
+        throttle (Throttle): If not None, called with the size of each block read.
+
+    Returns:
+        list: The damaged byte ranges of the data chunk, as (start, end) offsets relative to the start of the data
+            chunk, with adjacent damaged blocks merged. The list is empty if the data chunk is intact. If the size
+            of the data chunk changed, everything from the end of the shorter of the two is reported as damaged.
+
+    Raises:
+        BWFchunks.NotWaveError: If filename is not a RIFF/WAVE file.
+        ValueError: If there is no tree digest, or the file has no data chunk.
+    """
+
+    tree = tree or read_tree(filename)
+    if tree is None:
+        raise ValueError("{} has no tree digest".format(filename))
+    current = tree_digest(filename, tree["leaf_size"], jobs, throttle)
+
+    damaged = []
+
+    def add(start, end):
+        if damaged and damaged[-1][1] >= start:
+            damaged[-1] = (damaged[-1][0], max(damaged[-1][1], end))
+        else:
+            damaged.append((start, end))
+
+    size = tree["leaf_size"]
+    common = min(current["data_size"], tree["data_size"])
+    for index, (expected, actual) in enumerate(zip(tree["leaves"], current["leaves"])):
+        if expected != actual:
+            add(index * size, min((index + 1) * size, common))
+    if current["data_size"] != tree["data_size"]:
+        add(common, max(current["data_size"], tree["data_size"]))
+    return damaged
+
+
+def _read_stored_digest(filename, name, st, cache):
+    """Return the digest called name stored for filename (with the given stat result), or None."""
+    try:
+        value = os.getxattr(filename, "user.autobwf." + name).decode("ascii").split()
+        if len(value) == 3 and value[1:] == [str(st.st_size), str(st.st_mtime_ns)]:
+            return value[0]
+    except (OSError, AttributeError, UnicodeDecodeError):
+        pass
+    if cache is not None:
+        return cache.get_digest(filename, name)
+    return None
+
+
+def _store_digest(filename, name, digest, st, cache):
+    """Store a digest in an extended attribute of filename, or in cache if that is not possible."""
+    try:
+        value = "{} {} {}".format(digest, st.st_size, st.st_mtime_ns).encode("ascii")
+        os.setxattr(filename, "user.autobwf." + name, value)
+        return
+    except (OSError, AttributeError):
+        pass
+    if cache is not None:
+        cache.put_digest(filename, name, digest)
+
+
+def cached_digests(filename, data_algorithms=("md5",), file_algorithms=(), cache=None, rehash=False):
+    """Like file_digests(), but reuses the digests stored for an unchanged file and stores those it computes.
+
+    Only the digests that are not already stored are computed (in a single pass, as by file_digests()).
+
+    Args:
+        filename (str): The name of the Wave file.
+        data_algorithms (list): Names of the hashlib algorithms applied to the data chunk.
+        file_algorithms (list): Names of the hashlib algorithms applied to the whole file.
+        cache (BWFcache.MetadataCache): Where digests are stored if the filesystem does not support extended
+            attributes (if None, they are then not stored at all).
+        rehash (bool): If True, compute all the digests even if they are stored (e.g. for a fixity audit).
+
+    Returns:
+        dict: As returned by file_digests().
+
+    Raises:
+        BWFchunks.NotWaveError: If filename is not a RIFF/WAVE file.
+    """
+
+    st = os.stat(filename)
+    result = {"data": {}, "file": {}}
+    missing = {"data": [], "file": []}
+    for scope, algorithms in [("data", data_algorithms), ("file", file_algorithms)]:
+        for algorithm in algorithms:
+            digest = None if rehash else _read_stored_digest(filename, scope + "." + algorithm, st, cache)
+            if digest is None:
+                missing[scope].append(algorithm)
+            else:
+                result[scope][algorithm] = digest
+
+    if missing["data"] or missing["file"]:
+        computed = file_digests(filename, missing["data"], missing["file"])
+        for scope in computed:
+            for algorithm, digest in computed[scope].items():
+                result[scope][algorithm] = digest
+                if digest:
+                    _store_digest(filename, scope + "." + algorithm, digest, st, cache)
+    return result
+
+
+def data_md5_many(files, jobs=4, cache=None, rehash=False):
+    """Compute the data chunk MD5 digests of many Wave files, hashing up to jobs files at the same time.
+
+    Digests are reused and stored as by cached_digests().
+
+    Args:
+        files (list): The names of the Wave files.
+        jobs (int): Number of files hashed concurrently (see autoBWF.batch.job_count()).
+        cache (BWFcache.MetadataCache): See cached_digests().
+        rehash (bool): If True, compute all the digests even if they are stored.
+
+    Returns:
+        dict: The data chunk MD5 digest for each file, or None for files that could not be read.
+    """
+
+    from autoBWF.batch import imap
+
+    def md5(file):
+        return cached_digests(file, cache=cache, rehash=rehash)["data"]["md5"]
+
+    return {file: digest for file, digest, error in imap(md5, files, jobs)}
+
+
+def verify_data_md5(filename):
+    """Verify the data chunk of a Wave file against the digest stored in its MD5 chunk.
+
+    Args:
+        filename (str): The name of the Wave file.
+
+    Returns:
+        tuple: The stored and the computed digests (lowercase hex strings; the stored digest is empty if there is
+            no MD5 chunk), and whether they match (None if there is no stored digest).
+
+    Raises:
+        BWFchunks.NotWaveError: If filename is not a RIFF/WAVE file.
+    """
+
+    stored = BWFchunks.read_metadata(filename)["MD5Stored"]
+    generated = data_md5(filename)
+    return stored, generated, (stored == generated) if stored else None
@@ -1,21 +1,45 @@
 """Perform IO on BWF files.
 
-Convenience functions for reading from and writing to BWF files using bwfmetaedit subprocess calls.
+Convenience functions for reading from and writing to BWF files. Metadata chunks are read and written natively
+(see autoBWF.BWFchunks) and data chunk digests are verified natively (see autoBWF.BWFdigest); bwfmetaedit
+subprocess calls remain available as an alternative backend for both.
 
-Attributes:
-    bwfmetaedit (list): List of strings to be passed to subprocess.run(). This list should be appended to (after
-        copy()-ing) in order to perform the needed function. Its primary role is to keep track of whether
-        the "--accept-nopadding" option is or is not to be used. It may be modified by other modules
-        (such as autoBWF.py) that import this module.
+The *_async() coroutines provide an asyncio interface to the readers, so that many files can be awaited at once.
+
+Every get_*() and set_*() function accepts an optional Backend, which carries the bwfmetaedit command line and the
+metadata cache to be used. A Backend is immutable, so different configurations can be used concurrently by different
+threads; if none is given, the default backend (see default_backend()) is used.
 
+Attributes:
     namespaces (dict): Dict of XMP namespace URIs
+
+    batch_size (int): Maximum number of files passed to a single bwfmetaedit invocation by the *_many() functions.
+
+    max_concurrency (int): Maximum number of files read at the same time by the asyncio API (the *_async()
+        functions), across all tasks of an event loop.
 """
 
 import subprocess
 import os
+import sqlite3
+import tempfile
+import threading
+import weakref
 import xml.etree.ElementTree as ET
+from collections.abc import Mapping
+from typing import NamedTuple, Any
+
+from autoBWF import BWFchunks, BWFdigest
 
-bwfmetaedit = ["bwfmetaedit", "--specialchars"]
+batch_size = 200
+
+max_concurrency = 8
+
+_default_backend = None
+_shared_cache = None
+_lock = threading.Lock()
+
+_semaphores = weakref.WeakKeyDictionary()
 
 namespaces = {'dc': 'http://purl.org/dc/elements/1.1/',
               'xmp': 'http://ns.adobe.com/xap/1.0/',
@@ -27,30 +51,120 @@ namespaces = {'dc': 'http://purl.org/dc/elements/1.1/',
               "xml": "http://www.w3.org/XML/1998/namespace"}
 
 
-def get_xmp(filename):
-    """Runs bwfmetaedit to extract XMP metadata from a BWF file.
+class Backend(NamedTuple):
+    """Immutable configuration of the BWF file IO functions.
+
+    Use _replace() to derive a modified configuration, e.g. default_backend()._replace(accept_nopadding=True).
+
+    Attributes:
+        executable (str): The bwfmetaedit executable.
+        options (tuple): Options passed to every bwfmetaedit invocation.
+        accept_nopadding (bool): Whether files lacking RIFF pad bytes may be modified (natively, or by passing
+            "--accept-nopadding" to bwfmetaedit).
+        cache (BWFcache.MetadataCache): The metadata cache, or None to always read the files.
+        native (bool): Whether metadata chunks are written and data chunk digests verified natively, rather than by
+            bwfmetaedit.
+        digest_jobs (int): Number of files whose data chunks are hashed concurrently by the *_many() functions.
+        rehash (bool): Whether data chunk digests are always recomputed, rather than reused if they were stored
+            (see BWFdigest.cached_digests()) while the file was in its current state.
+        catalogue (BWFcatalogue.Catalogue): If not None, BWFRecords are filled from this catalogue for the files it
+            holds in their current state, and the other files are added to it once fully extracted.
+    """
+
+    executable: str = "bwfmetaedit"
+    options: tuple = ("--specialchars",)
+    accept_nopadding: bool = False
+    cache: Any = None
+    native: bool = True
+    digest_jobs: int = 4
+    rehash: bool = False
+    catalogue: Any = None
+
+    def command(self, *args):
+        """Returns the bwfmetaedit command line (as a list to be passed to subprocess.run()) with args appended."""
+        command = [self.executable]
+        command.extend(self.options)
+        if self.accept_nopadding:
+            command.append("--accept-nopadding")
+        command.extend(args)
+        return command
+
+
+def shared_cache():
+    """Return the persistent BWFcache.MetadataCache, opening it on first use, or None if it is unavailable."""
+    global _shared_cache
+
+    with _lock:
+        if _shared_cache is None:
+            from autoBWF.BWFcache import MetadataCache
+            try:
+                _shared_cache = MetadataCache()
+            except (OSError, sqlite3.Error):
+                _shared_cache = False
+    return _shared_cache or None
+
+
+def default_backend():
+    """Return the Backend used when none is given, by default a Backend() using the shared_cache()."""
+    global _default_backend
+
+    if _default_backend is None:
+        cache = shared_cache()
+        with _lock:
+            if _default_backend is None:
+                _default_backend = Backend(cache=cache)
+    return _default_backend
+
+
+def _read_metadata(filename, backend=None):
+    """Returns the core and tech metadata and the raw XMP packet of a BWF file, from the metadata cache if possible.
+
+    The XMP packet is only parsed by get_xmp(), so that a malformed packet does not prevent the other metadata from
+    being read. It is stored (under "packet") as text, or None if the file has no _PMX chunk.
+
+    Raises:
+        BWFchunks.NotWaveError: If filename is not a RIFF/WAVE file.
+    """
+
+    cache = (backend or default_backend()).cache
+    if cache is not None:
+        md = cache.get(filename)
+        if md is not None:
+            return md
+
+    raw = BWFchunks.read_metadata(filename)
+    packet = raw["xmp"].decode("utf-8", "surrogateescape") if raw["xmp"] is not None else None
+    md = {"core": raw["core"], "tech": raw["tech"], "packet": packet}
+    if cache is not None:
+        cache.put(filename, md)
+    return md
+
+
+def _invalidate(filename, backend=None):
+    """Discards the cached metadata of a file that has just been written."""
+    for cache in {(backend or default_backend()).cache, _shared_cache or None}:
+        if cache is not None:
+            cache.invalidate(filename)
+
+
+def parse_xmp(xmp):
+    """Parses an XMP packet into the autoBWF XMP metadata fields.
 
     Args:
-        filename (str): The name of the target BWF file.
+        xmp (bytes): The XMP packet as stored in the _PMX chunk, or None if the file has no XMP.
 
     Returns:
         dict:  Dict of metadata values indexed by the field name. If field is empty, the value is an empty string.
     """
 
-    command = bwfmetaedit.copy()
-    command.extend(["--out-XMP-xml", filename])
-    subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    outfile = filename + ".XMP.xml"
-    try:
-        tree = ET.parse(outfile)
-    except FileNotFoundError:
+    if not xmp:
         md = {"interviewer": "", "interviewee": "", "owner": "",
               "metadataDate": "", "language": "", "xmp_description": "",
               "form": "", "host": "", "speaker": "", "performer": "",
               "topics": "", "names": "", "events": "", "places": "", "creator": ""
               }
         return md
-    root = tree.getroot()
+    root = ET.fromstring(xmp)
 
     def check_li_child(element, xpath):
         """Provides backwards compatibility for XMP saved using exempi and python-metadata-toolkit"""
@@ -87,17 +201,36 @@ def get_xmp(filename):
         else:
             md[field] = ""
 
-    os.remove(outfile)
     return md
 
 
-def set_xmp(md, filename):
-    """Runs bwfmetaedit to extract XMP metadata from a BWF file.
+def get_xmp(filename, backend=None):
+    """Reads the _PMX chunk of a BWF file and extracts the XMP metadata.
+
+    Args:
+        filename (str): The name of the target BWF file.
+        backend (Backend): The configuration to use, by default default_backend().
+
+    Returns:
+        dict:  Dict of metadata values indexed by the field name. If field is empty, the value is an empty string.
+
+    Raises:
+        xml.etree.ElementTree.ParseError: If the XMP packet is malformed.
+    """
+
+    packet = _read_metadata(filename, backend)["packet"]
+    return parse_xmp(packet.encode("utf-8", "surrogateescape") if packet is not None else None)
+
+
+def build_xmp(md):
+    """Constructs an XMP packet from the autoBWF XMP metadata fields.
 
     Args:
         md (dict): Dict of metadata values indexed by the field name.
             If field is empty, the value should be an empty string.
-        filename (str): The name of the target BWF file.
+
+    Returns:
+        bytes: The serialized XMP.
     """
 
     from datetime import datetime
@@ -172,30 +305,99 @@ def set_xmp(md, filename):
             language_item = ET.SubElement(language_bag, qualified_element("rdf", "li"))
             language_item.text = lang
 
-    xmlfile = filename + ".XMP.xml"
-    ET.ElementTree(root).write(xmlfile)
-    command = bwfmetaedit.copy()
-    command.extend(['--in-XMP=' + xmlfile, filename])
-    subprocess.run(command)
-    os.remove(xmlfile)
+    return ET.tostring(root)
+
+
+def set_xmp(md, filename, backend=None):
+    """Writes XMP metadata to a BWF file.
+
+    Args:
+        md (dict): Dict of metadata values indexed by the field name.
+            If field is empty, the value should be an empty string.
+        filename (str): The name of the target BWF file.
+        backend (Backend): The configuration to use, by default default_backend().
+    """
+
+    set_bwf_metadata({}, filename, xmp=md, backend=backend)
+
+
+def _bwfmetaedit_option(key, text):
+    """Convenience function to deal with annoying inconsistencies in bwfmetaedit field naming"""
+
+    if key == "TimeReference":
+        key = "Timereference"
+    elif key == "CodingHistory":
+        key = "History"
+    return "--" + key + "=" + text
 
 
-def check_wave(filename):
+def set_bwf_metadata(md, filename, xmp=None, md5_embed=False, backend=None):
+    """Writes BWF core metadata, XMP and the data chunk MD5 digest to a BWF file in a single pass.
+
+    If the backend is native, all changed chunks are written by one call of BWFchunks.write_metadata(), which
+    touches the file in place when possible and rewrites it at most once. Otherwise, everything is handed to a single
+    bwfmetaedit invocation.
+
+    Args:
+        md (dict): BWF core metadata values indexed by the field name (e.g. "Description", "TimeReference",
+            "INAM"). Only the fields that are present are changed.
+        filename (str): The name of the target BWF file.
+        xmp (dict): XMP metadata values as accepted by build_xmp(), or None to leave the XMP unchanged.
+        md5_embed (bool): If True, compute the MD5 digest of the data chunk and store it in the MD5 chunk.
+        backend (Backend): The configuration to use, by default default_backend().
+
+    Raises:
+        BWFchunks.WriteError: If the file cannot be modified natively.
+    """
+
+    backend = backend or default_backend()
+
+    if backend.native:
+        try:
+            BWFchunks.write_metadata(filename, md, xmp=build_xmp(xmp) if xmp is not None else None,
+                                     md5_embed=md5_embed, accept_nopadding=backend.accept_nopadding)
+        finally:
+            _invalidate(filename, backend)
+        return
+
+    command = backend.command()
+    # Need to save coding history for last. If we don't, then for some bizarre reason there's duplication
+    # of the last two characters of the history string...
+    keys = sorted(md, key=lambda k: k == "CodingHistory")
+    command.extend(_bwfmetaedit_option(k, md[k]) for k in keys)
+    if md5_embed:
+        command.append("--MD5-embed")
+
+    # bwfmetaedit can only import XMP from a file. It is staged in a private temporary directory (honoring TMPDIR,
+    # which may be a tmpfs) rather than next to the audio, so that nothing is created in the archive directory.
+    with tempfile.TemporaryDirectory(prefix="autoBWF-") as tempdir:
+        if xmp is not None:
+            xmlfile = os.path.join(tempdir, "XMP.xml")
+            with open(xmlfile, "wb") as f:
+                f.write(build_xmp(xmp))
+            command.append("--in-XMP=" + xmlfile)
+        command.append(filename)
+        subprocess.run(command)
+    _invalidate(filename, backend)
+
+
+def check_wave(filename, backend=None):
     """Confirm that filename is a legitimate Wave file.
 
-    This is done by running bwfmetaedit to extract the technical metadata, which should work even if there is no
-    pre-existing BWF chunk.
+    This is done by walking the RIFF chunk list and decoding the technical metadata, which should work even if
+    there is no pre-existing BWF chunk.
 
     Args:
         filename (str): The name of the file.
+        backend (Backend): The configuration to use, by default default_backend().
 
     Returns:
         dict: Technical metadata values indexed by the field name. If field is empty, the value is an empty string.
             If filename is not a Wave file, then the return value is None.
     """
     try:
-        md = get_bwf_tech(filename)
-    except subprocess.CalledProcessError:
+        md = get_bwf_tech(filename, backend=backend)
+    except (OSError, BWFchunks.NotWaveError, ET.ParseError):
         return None
 
     if md["Errors"] == "":
@@ -204,26 +406,38 @@ def check_wave(filename):
         return None
 
 
-def get_bwf_tech(file, verify_digest=False):
-    """Runs bwfmetaedit to extract BWF technical metadata from a BWF file.
+def get_bwf_tech(file, verify_digest=False, backend=None):
+    """Extracts BWF technical metadata from a BWF file.
+
+    The fmt chunk and the data chunk size are decoded natively, so no audio is read unless the data chunk digest
+    is to be verified (natively, or by running bwfmetaedit if the backend is not native).
 
     Args:
         file (str): The name of the target BWF file.
-        verify_digest (bool): If True, add "--MD5-verify" to the bwfmetaedit call.
+        verify_digest (bool): If True, compute the data chunk digest to fill in MD5Generated.
+        backend (Backend): The configuration to use, by default default_backend().
 
     Returns:
         dict: Metadata values indexed by the field name. If field is empty, the value is an empty string.
+
+    Raises:
+        BWFchunks.NotWaveError: If file is not a RIFF/WAVE file.
     """
 
     import io
     import csv
 
-    command = bwfmetaedit.copy()
-    command.append("--out-tech")
-    if verify_digest:
-        command.extend(["--MD5-verify", file])
-    else:
-        command.append(file)
+    if not verify_digest:
+        return dict(_read_metadata(file, backend)["tech"])
+
+    backend = backend or default_backend()
+    if backend.native:
+        tech = dict(_read_metadata(file, backend)["tech"])
+        tech["MD5Generated"] = BWFdigest.cached_digests(file, cache=backend.cache,
+                                                        rehash=backend.rehash)["data"]["md5"]
+        return tech
+
+    command = backend.command("--out-tech", "--MD5-verify", file)
 
     tech_csv = subprocess.check_output(command, universal_newlines=True)
     f = io.StringIO(tech_csv)
@@ -260,32 +474,489 @@ def parse_bwf_description(description):
     return md
 
 
-def get_bwf_core(file):
-    """Runs bwfmetaedit to extract BWF core metadata from a BWF file.
+def get_bwf_core(file, backend=None):
+    """Reads the bext and LIST/INFO chunks of a BWF file to extract BWF core metadata.
+
+    The returned dict has the same keys as the CSV output of "bwfmetaedit --out-core", plus the fields generated
+    by parse_bwf_description().
 
     Args:
         file (str): The name of the target BWF file.
+        backend (Backend): The configuration to use, by default default_backend().
 
     Returns:
         dict: Metadata values indexed by the field name. If field is empty, the value is an empty string.
+
+    Raises:
+        BWFchunks.NotWaveError: If file is not a RIFF/WAVE file.
+    """
+
+    core = dict(_read_metadata(file, backend)["core"])
+    core.update(parse_bwf_description(core["Description"]))
+    return core
+
+
+def batched(files, size=None):
+    """Splits an iterable of files into consecutive lists of at most size (by default, batch_size) files.
+
+    The files are consumed lazily, so that a stream of files (e.g. from find_wave_files()) is processed as it is
+    generated.
+    """
+
+    from itertools import islice
+
+    size = size or batch_size
+    files = iter(files)
+    batch = list(islice(files, size))
+    while batch:
+        yield batch
+        batch = list(islice(files, size))
+
+
+def find_wave_files(top, pattern=None):
+    """Yields the Wave files (with a .wav extension, in any case) in a directory tree.
+
+    The tree is traversed with os.scandir() and the files are yielded as they are found, so that arbitrarily
+    large archives can be processed without first building a list of their contents. Symbolic links to
+    directories are not followed.
+
+    Args:
+        top (str): The root directory of the tree.
+        pattern (str): If not None, a regular expression that the file path must match (as with the
+            "filenameRegex" configuration value).
+
+    Yields:
+        str: The path of each file, starting with top.
+    """
+
+    import re
+
+    regex = re.compile(pattern) if pattern is not None else None
+    directories = [top]
+    while directories:
+        directory = directories.pop()
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirectories = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif entry.name.lower().endswith(".wav") and entry.is_file():
+                if regex is None or regex.match(entry.path):
+                    yield entry.path
+        directories.extend(reversed(subdirectories))
+
+
+def _run_bwfmetaedit_csv(options, files, backend=None):
+    """Runs bwfmetaedit with a CSV output option on many files, batch_size files per invocation.
+
+    Args:
+        options (list): bwfmetaedit options, e.g. ["--out-tech", "--MD5-verify"].
+        files (list): The names of the target BWF files.
+        backend (Backend): The configuration to use, by default default_backend().
+
+    Returns:
+        dict: The CSV row (a dict indexed by field name) for each file, or None for files that bwfmetaedit
+            could not process.
     """
 
     import io
     import csv
 
-    command = bwfmetaedit.copy()
-    command.extend(["--out-core", file])
+    results = {}
+    for batch in batched(files):
+        command = (backend or default_backend()).command(*options)
+        command.extend(batch)
+        output = subprocess.run(command, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        rows = list(csv.DictReader(io.StringIO(output), delimiter=','))
+        by_name = {row["FileName"]: row for row in rows if row.get("FileName")}
+        for i, file in enumerate(batch):
+            row = by_name.get(file)
+            if row is None and len(rows) == len(batch):
+                row = rows[i]
+            results[file] = row
+    return results
 
-    core_csv = subprocess.check_output(command, universal_newlines=True)
-    f = io.StringIO(core_csv)
-    reader = csv.DictReader(f, delimiter=',')
-    core = next(reader)
-    for key in core.keys():
-        if core[key] is None:
-            core[key] = ""
 
-    core.update(parse_bwf_description(core["Description"]))
-    return core
+def get_bwf_core_many(files, backend=None):
+    """Extracts BWF core metadata from many BWF files.
+
+    Args:
+        files (list): The names of the target BWF files.
+        backend (Backend): The configuration to use, by default default_backend().
+
+    Returns:
+        dict: The metadata returned by get_bwf_core() for each file, or None for files that are not Wave files.
+    """
+
+    results = {}
+    for file in files:
+        try:
+            results[file] = get_bwf_core(file, backend=backend)
+        except (OSError, BWFchunks.NotWaveError):
+            results[file] = None
+    return results
+
+
+def get_bwf_tech_many(files, verify_digest=False, backend=None):
+    """Extracts BWF technical metadata from many BWF files.
+
+    If the data chunk digests are to be verified, backend.digest_jobs files are hashed concurrently (or, if the
+    backend is not native, bwfmetaedit is run on batch_size files per invocation rather than once per file).
+
+    Args:
+        files (list): The names of the target BWF files.
+        verify_digest (bool): If True, compute the data chunk digests to fill in MD5Generated.
+        backend (Backend): The configuration to use, by default default_backend().
+
+    Returns:
+        dict: The metadata returned by get_bwf_tech() for each file, or None for files that could not be read.
+    """
+
+    backend = backend or default_backend()
+    if verify_digest and not backend.native:
+        return _run_bwfmetaedit_csv(["--out-tech", "--MD5-verify"], files, backend=backend)
+
+    results = {}
+    for file in files:
+        try:
+            results[file] = get_bwf_tech(file, backend=backend)
+        except (OSError, BWFchunks.NotWaveError):
+            results[file] = None
+
+    if verify_digest:
+        digests = BWFdigest.data_md5_many([file for file in files if results[file] is not None],
+                                          jobs=backend.digest_jobs, cache=backend.cache, rehash=backend.rehash)
+        for file, digest in digests.items():
+            if digest is None:
+                results[file] = None
+            else:
+                results[file]["MD5Generated"] = digest
+    return results
+
+
+def set_bwf_core_many(md, backend=None):
+    """Runs bwfmetaedit "--in-core" to write BWF core metadata to many BWF files.
+
+    The metadata are staged as a single CSV file in a private temporary directory, and bwfmetaedit imports it in
+    one invocation per batch_size files.
+
+    Args:
+        md (dict): For each target BWF file, a dict of metadata values indexed by the field name (e.g.
+            "Description", "INAM"). All files should have the same set of fields, since every file receives every
+            field that occurs in any of the dicts (missing values are written as empty strings).
+        backend (Backend): The configuration to use, by default default_backend().
+
+    Returns:
+        dict: An error message for each file that may not have been written (empty if all files were written). If
+            bwfmetaedit fails, every file of its batch is listed.
+    """
+
+    import csv
+
+    failed = {}
+    fields = []
+    for values in md.values():
+        fields.extend(k for k in values if k not in fields)
+
+    with tempfile.TemporaryDirectory(prefix="autoBWF-") as tempdir:
+        for number, batch in enumerate(batched(list(md))):
+            csvfile = os.path.join(tempdir, "core{}.csv".format(number))
+            with open(csvfile, "w", newline="") as f:
+                writer = csv.DictWriter(f, ["FileName"] + fields)
+                writer.writeheader()
+                for file in batch:
+                    row = {k: md[file].get(k, "") for k in fields}
+                    row["FileName"] = file
+                    writer.writerow(row)
+
+            command = (backend or default_backend()).command("--in-core=" + csvfile)
+            command.extend(batch)
+            try:
+                returncode = subprocess.run(command).returncode
+                error = "bwfmetaedit exited with status {}".format(returncode) if returncode != 0 else None
+            except OSError as e:
+                error = "could not run {} ({})".format(command[0], e)
+            for file in batch:
+                _invalidate(file, backend)
+                if error is not None:
+                    failed[file] = error
+    return failed
+
+
+def _batch_size_for(files, jobs):
+    """Returns the batch size that keeps jobs workers busy (see iter_bwf_core_and_tech())."""
+    from autoBWF.batch import job_count
+
+    if job_count(jobs) == 1:
+        return batch_size
+    if isinstance(files, (list, tuple)):
+        return max(1, min(batch_size, -(-len(files) // (4 * job_count(jobs)))))
+    return max(1, batch_size // (4 * job_count(jobs)))
+
+
+def iter_bwf_core_and_tech(files, verify_digest=False, jobs=1, backend=None):
+    """Yields BWF core and technical metadata for many BWF files, extracting them batch_size files at a time.
+
+    Args:
+        files (iterable): The names of the target BWF files. They are consumed one batch at a time.
+        verify_digest (bool): If True, verify the data chunk digests (see get_bwf_tech_many()).
+        jobs (int): Number of batches extracted concurrently (see autoBWF.batch.job_count()). If more than one,
+            the batches are made smaller so that all workers are kept busy.
+        backend (Backend): The configuration to use, by default default_backend().
+
+    Yields:
+        tuple: The file name, its core metadata and its technical metadata, in the order of files. The metadata
+            are None if the file could not be read.
+    """
+
+    from autoBWF.batch import imap
+
+    def read_batch(batch):
+        return (get_bwf_core_many(batch, backend=backend),
+                get_bwf_tech_many(batch, verify_digest=verify_digest, backend=backend))
+
+    for batch, result, error in imap(read_batch, batched(files, _batch_size_for(files, jobs)), jobs):
+        if error is not None:
+            raise error
+        cores, techs = result
+        for file in batch:
+            yield file, cores[file], techs[file]
+
+
+class BWFRecord(Mapping):
+    """Read-only mapping of all the metadata of a BWF file, which extracts each group of fields on first access.
+
+    The fields are those of get_bwf_core(), get_bwf_tech() and get_xmp() (where the same field occurs in more than
+    one group, the later group wins), plus "filename". Accessing a field of a group that has not yet been
+    extracted runs the corresponding function, so that e.g. no digest is verified unless a technical field is used.
+    If the backend has a catalogue, the fields are first looked up there (see autoBWF.BWFcatalogue).
+
+    Args:
+        filename (str): The name of the target BWF file.
+        verify_digest (bool): Whether the technical metadata include a verified MD5Generated (see get_bwf_tech()).
+        backend (Backend): The configuration to use, by default default_backend().
+
+    Raises:
+        BWFchunks.NotWaveError, OSError: On access to a field, if the file cannot be read.
+    """
+
+    groups = {"core": BWFchunks.CORE_FIELDS + ["FileContent", "FileUse", "OriginalFilename"],
+              "tech": BWFchunks.TECH_FIELDS,
+              "xmp": list(parse_xmp(None))}
+
+    _field_groups = {field: group for group, fields in groups.items() for field in fields}
+
+    #: All field names, in the order of iteration
+    fields = ["filename"] + list(_field_groups)
+
+    def __init__(self, filename, verify_digest=False, backend=None):
+        self.filename = filename
+        self.verify_digest = verify_digest
+        self.backend = backend
+        self.loaded = {}
+        self._catalogued = None
+
+    @classmethod
+    def groups_of(cls, fields):
+        """Return the set of groups that must be extracted to obtain fields (all groups if fields is None)."""
+        if fields is None:
+            return set(cls.groups)
+        return {cls._field_groups[field] for field in fields if field in cls._field_groups}
+
+    def load(self, groups):
+        """Extract the given groups of fields now, unless they already have been."""
+        catalogue = (self.backend or default_backend()).catalogue
+        if catalogue is not None and self._catalogued is None:
+            self._catalogued = catalogue.get(self.filename) or {}
+            for group, fields in self._catalogued.items():
+                # digests are not verified by the catalogue
+                if group != "tech" or not self.verify_digest:
+                    self.loaded.setdefault(group, fields)
+
+        for group in ["core", "tech", "xmp"]:
+            if group in groups and group not in self.loaded:
+                if group == "core":
+                    self.loaded[group] = get_bwf_core(self.filename, backend=self.backend)
+                elif group == "tech":
+                    self.loaded[group] = get_bwf_tech(self.filename, verify_digest=self.verify_digest,
+                                                      backend=self.backend)
+                else:
+                    self.loaded[group] = get_xmp(self.filename, backend=self.backend)
+
+        if catalogue is not None and not self._catalogued and len(self.loaded) == len(self.groups):
+            catalogue.put(self.filename, self.loaded)
+            self._catalogued = self.loaded
+
+    def __getitem__(self, field):
+        if field == "filename":
+            return self.filename
+        group = self._field_groups[field]
+        self.load([group])
+        return self.loaded[group][field]
+
+    def __contains__(self, field):
+        return field in self._field_groups or field == "filename"
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+
+def iter_bwf_records(files, fields=None, verify_digest=False, jobs=1, backend=None):
+    """Yields BWFRecords for many BWF files, with the groups needed for fields already extracted.
+
+    The extraction is done batch_size files at a time, like iter_bwf_core_and_tech(): in particular, the data
+    chunk digests of a batch are verified together (see get_bwf_tech_many()). Groups that are not needed for fields
+    are not extracted at all (unless the record is later accessed for them), except that all groups are extracted
+    for files that are missing from the catalogue of the backend, if it has one, so that they can be catalogued.
+
+    Args:
+        files (iterable): The names of the target BWF files. They are consumed one batch at a time.
+        fields (list): The fields that will be used, or None for all of them.
+        verify_digest (bool): If True, verify the data chunk digests (see get_bwf_tech_many()).
+        jobs (int): Number of batches extracted concurrently (see autoBWF.batch.job_count()).
+        backend (Backend): The configuration to use, by default default_backend().
+
+    Yields:
+        tuple: The file name, its BWFRecord (None if it could not be extracted) and the exception raised by the
+            extraction (None if it succeeded), in the order of files.
+    """
+
+    from autoBWF.batch import imap
+
+    groups = BWFRecord.groups_of(fields)
+    if (backend or default_backend()).catalogue is not None:
+        groups = BWFRecord.groups_of(None)
+
+    def read_batch(batch):
+        techs = {}
+        if verify_digest and "tech" in groups:
+            techs = get_bwf_tech_many(batch, verify_digest=True, backend=backend)
+        results = []
+        for file in batch:
+            record = BWFRecord(file, verify_digest=verify_digest, backend=backend)
+            try:
+                if file in techs:
+                    if techs[file] is None:
+                        raise BWFchunks.NotWaveError(file)
+                    record.loaded["tech"] = techs[file]
+                record.load(groups)
+                results.append((file, record, None))
+            except Exception as e:
+                results.append((file, None, e))
+        return results
+
+    for batch, results, error in imap(read_batch, batched(files, _batch_size_for(files, jobs)), jobs):
+        if error is not None:
+            raise error
+        yield from results
+
+
+def _semaphore():
+    """Returns the semaphore limiting the concurrency of the asyncio API in the running event loop."""
+    import asyncio
+
+    loop = asyncio.get_event_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(max_concurrency)
+    return semaphore
+
+
+async def _run_async(func, *args):
+    """Runs a blocking function of this module in the default executor, subject to the global semaphore."""
+    import asyncio
+
+    async with _semaphore():
+        return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+
+async def get_bwf_core_async(file, backend=None):
+    """Coroutine version of get_bwf_core()."""
+    return await _run_async(get_bwf_core, file, backend)
+
+
+async def get_xmp_async(filename, backend=None):
+    """Coroutine version of get_xmp()."""
+    return await _run_async(get_xmp, filename, backend)
+
+
+async def check_wave_async(filename, backend=None):
+    """Coroutine version of check_wave()."""
+    return await _run_async(check_wave, filename, backend)
+
+
+async def get_bwf_tech_async(file, verify_digest=False, backend=None):
+    """Coroutine version of get_bwf_tech().
+
+    If the data chunk digest is to be verified by bwfmetaedit (i.e. the backend is not native), it is run with
+    asyncio.create_subprocess_exec(), so that any number of verifications can be awaited without tying up executor
+    threads.
+    """
+
+    import asyncio
+    import io
+    import csv
+
+    backend = backend or default_backend()
+    if not verify_digest or backend.native:
+        return await _run_async(get_bwf_tech, file, verify_digest, backend)
+
+    command = backend.command("--out-tech", "--MD5-verify", file)
+
+    async with _semaphore():
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE)
+        output, _ = await process.communicate()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, output)
+    return next(csv.DictReader(io.StringIO(output.decode()), delimiter=','))
+
+
+async def load_bwf_async(file, verify_digest=False, backend=None):
+    """Reads the technical, core and XMP metadata of a BWF file concurrently.
+
+    Args:
+        file (str): The name of the target BWF file.
+        verify_digest (bool): If True, verify the data chunk digest (see get_bwf_tech_async()).
+        backend (Backend): The configuration to use, by default default_backend().
+
+    Returns:
+        dict: The merged metadata, as returned by get_bwf_tech(), get_bwf_core() and get_xmp(), or None if file
+            does not exist, is not a valid Wave file or has malformed XMP.
+    """
+
+    import asyncio
+
+    try:
+        tech, core, xmp = await asyncio.gather(get_bwf_tech_async(file, verify_digest, backend),
+                                               get_bwf_core_async(file, backend), get_xmp_async(file, backend))
+    except (OSError, BWFchunks.NotWaveError, ET.ParseError, subprocess.CalledProcessError):
+        return None
+    if tech["Errors"] != "":
+        return None
+
+    md = tech
+    md.update(core)
+    md.update(xmp)
+    return md
+
+
+async def load_bwf_many_async(files, verify_digest=False, backend=None):
+    """Reads the metadata of many BWF files concurrently (at most max_concurrency files at a time).
+
+    Returns:
+        dict: The metadata returned by load_bwf_async() for each file.
+    """
+
+    import asyncio
+
+    results = await asyncio.gather(*[load_bwf_async(file, verify_digest, backend) for file in files])
+    return dict(zip(files, results))
 
 
 if __name__ == "__main__":
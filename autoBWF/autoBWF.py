@@ -21,7 +21,7 @@ from PyQt5 import QtCore
 from autoBWF.tabbed import Ui_autoBWF
 from autoBWF.export_dialog import Ui_Export
 import autoBWF.BWFfileIO as bwfio
-from autoBWF.autobwfconfig import default_config
+from autoBWF.autobwfconfig import config_file, load_config
 
 
 class MainWindow(QtWidgets.QMainWindow, Ui_autoBWF):
@@ -52,8 +52,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_autoBWF):
         self.template_md = None  #: Embedded metadata present in the template file
         self.edited_md = {}  #: Metadata values that have been edited by the GUI user.
 
-        if config["accept-nopadding"]:
-            bwfio.bwfmetaedit.append("--accept-nopadding")
+        #: Configuration of the BWF file IO functions
+        self.backend = bwfio.default_backend()._replace(accept_nopadding=bool(config["accept-nopadding"]))
 
         #: dict of PyQt widgets: all text input widgets in the GUI, indexed by metadata field name
         self.gui_text_widgets = {
@@ -197,8 +197,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_autoBWF):
             if self.template_md is not None:
                 self.populate_template_info()
 
-    @staticmethod
-    def load_file(file, die_on_error=False):
+    def load_file(self, file, die_on_error=False):
         """Read metadata from a BWF file.
 
         Args:
@@ -209,10 +208,10 @@ class MainWindow(QtWidgets.QMainWindow, Ui_autoBWF):
             Dict of metadata if successful, None otherwise.
 
         """
-        md = bwfio.check_wave(file)
+        md = bwfio.check_wave(file, backend=self.backend)
         if md is not None:
-            md.update(bwfio.get_bwf_core(file))
-            md.update(bwfio.get_xmp(file))
+            md.update(bwfio.get_bwf_core(file, backend=self.backend))
+            md.update(bwfio.get_xmp(file, backend=self.backend))
             return md
 
         msg = QMessageBox()
@@ -568,22 +567,9 @@ class MainWindow(QtWidgets.QMainWindow, Ui_autoBWF):
     def save_metadata(self):
         """Slot function called in response to the "Save metadata" menu bar action.
 
-        Performs bwfmetaedit calls to insert updated metadata into the BWF file.
+        Writes the changed BWF core metadata, the XMP and (optionally) the MD5 digest into the BWF file in a
+        single pass.
         """
-        def _call_bwf(file, given_key, text):
-            """Convenience function to deal with annoying inconsistencies in bwfmetaedit field naming"""
-
-            if given_key == "TimeReference":
-                renamed_key = "Timereference"
-            elif given_key == "CodingHistory":
-                renamed_key = "History"
-            else:
-                renamed_key = given_key
-
-            command = bwfio.bwfmetaedit.copy()
-            command.extend(['--' + renamed_key + "=" + text, file])
-            subprocess.run(command)
-
         current_md, changed_bwf_riff, changed_xmp = self.get_current_and_changed()
 
         if not changed_xmp and not changed_bwf_riff:
@@ -598,41 +584,29 @@ class MainWindow(QtWidgets.QMainWindow, Ui_autoBWF):
         self.progressBar.setMaximum(6)
         QtWidgets.QApplication.processEvents()
 
-        if self.md5Check.isChecked() and self.md5Check.isEnabled():
-            self.progressBar.setValue(1)
-            self.statusLabel.setText("Generating MD5 digest")
-            QtWidgets.QApplication.processEvents()
-            command = bwfio.bwfmetaedit.copy()
-            command.extend(["--MD5-embed", self.filename])
-            subprocess.run(command)
-
+        md5_embed = self.md5Check.isChecked() and self.md5Check.isEnabled()
         if self.original_md["TimeReference"] != '0':
-            self.progressBar.setValue(2)
-            self.statusLabel.setText("Saving time reference")
-            QtWidgets.QApplication.processEvents()
-            _call_bwf(self.filename, "TimeReference", "0")
-
-        # Need to save coding history for last. If we don't, then for some bizarre reason there's duplication
-        # of the last two characters of the history string...
-        coding_history = changed_bwf_riff.pop("CodingHistory", None)
-
-        for key in changed_bwf_riff:
-            self.progressBar.setValue(3)
-            self.statusLabel.setText("Saving {}".format(key))
-            QtWidgets.QApplication.processEvents()
-            _call_bwf(self.filename, key, current_md[key])
-
-        if coding_history:
-            self.progressBar.setValue(4)
-            self.statusLabel.setText("Saving coding history")
-            QtWidgets.QApplication.processEvents()
-            _call_bwf(self.filename, "CodingHistory", coding_history)
+            changed_bwf_riff["TimeReference"] = "0"
 
         # something has changed, therefore at minimum we need to update xmp:MetadataDate
-        self.progressBar.setValue(5)
-        self.statusLabel.setText("Saving XMP")
+        self.progressBar.setValue(3)
+        if md5_embed:
+            self.statusLabel.setText("Generating MD5 digest and saving metadata")
+        else:
+            self.statusLabel.setText("Saving metadata")
         QtWidgets.QApplication.processEvents()
-        bwfio.set_xmp({k: current_md[k] for k in self.xmp_fields}, self.filename)
+        try:
+            bwfio.set_bwf_metadata(changed_bwf_riff, self.filename,
+                                   xmp={k: current_md[k] for k in self.xmp_fields}, md5_embed=md5_embed,
+                                   backend=self.backend)
+        except (bwfio.BWFchunks.WriteError, bwfio.BWFchunks.NotWaveError, OSError) as e:
+            self.stackedWidget.setCurrentIndex(0)
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Critical)
+            msg.setText("Could not save metadata: {}".format(e))
+            msg.exec_()
+            return
+        self.progressBar.setValue(6)
 
         time.sleep(0.6)  # wait at least a little to make it less visually disconserting
         self.stackedWidget.setCurrentIndex(0)
@@ -787,11 +761,8 @@ class Export(QtWidgets.QDialog, Ui_Export):
 
 
 def main():
-    import json
     import argparse
 
-    from appdirs import AppDirs
-
     try:
         subprocess.check_output("bwfmetaedit")
     except FileNotFoundError:
@@ -800,19 +771,7 @@ def main():
             "Please download and install the latest version from https://mediaarea.net/BWFMetaEdit/Download.\n"
             "Note that you must install the 'CLI' version (in addition to the GUI, if desired)."))
 
-    default_text = default_config()
-
-    dirs = AppDirs("autoBWF", "UHEC")
-    config_file = Path(dirs.user_data_dir) / "autobwfconfig.json"
-
-    try:
-        config_text = config_file.read_text()
-    except FileNotFoundError:
-        Path(dirs.user_data_dir).mkdir(parents=True, exist_ok=True)
-        config_handle = config_file.write_text(default_text)
-        config_text = default_text
-
-    config = json.loads(config_text)
+    config = load_config()
 
     parser = argparse.ArgumentParser(description='Create internal metadata for WAV file(s).')
     parser.add_argument('filename', nargs='?', help='WAV file to be processed')
@@ -823,7 +782,7 @@ def main():
     template = args.t
 
     if args.config:
-        print('Your configuration file is ' + str(config_file.resolve()))
+        print('Your configuration file is ' + str(config_file().resolve()))
         exit()
 
     app = QtWidgets.QApplication(sys.argv)
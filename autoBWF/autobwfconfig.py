@@ -1,10 +1,36 @@
 """
-This function is used to generate the default configuration file text.
+These functions are used to locate and load the configuration file, and to generate the default configuration
+file text.
 
-Yes, it could be stored as data in the package, but that would require a dependency on setuptools, and there's
-no need for another package for something this simple.
+Yes, the default could be stored as data in the package, but that would require a dependency on setuptools, and
+there's no need for another package for something this simple.
 """
 
+from pathlib import Path
+
+
+def config_file():
+    """Return the Path of the configuration file in the user data directory appropriate to the OS."""
+    from appdirs import AppDirs
+
+    dirs = AppDirs("autoBWF", "UHEC")
+    return Path(dirs.user_data_dir) / "autobwfconfig.json"
+
+
+def load_config():
+    """Load and parse the configuration file, creating it with the default contents if it does not exist."""
+    import json
+
+    path = config_file()
+    try:
+        config_text = path.read_text()
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        config_text = default_config()
+        path.write_text(config_text)
+
+    return json.loads(config_text)
+
 
 def default_config():
     default = """\
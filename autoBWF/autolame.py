@@ -2,6 +2,7 @@ import sys
 import argparse
 import re
 from autoBWF.BWFfileIO import *
+from autoBWF.batch import add_jobs_argument, imap
 
 
 # There is no easy way to write XMP to MP3 without the python-xmp-toolkit and exempi (which was eliminated in v3.1).
@@ -48,24 +49,32 @@ def main():
     parser.add_argument('-o', dest="outfile", help="MP3 file")
     parser.add_argument('--vbr-level', help="MP3 VBR encoding level", type=int, default=7)
     parser.add_argument('--cbr', help="MP3 CBR bitrate", type=int, default=None)
+    add_jobs_argument(parser)
     parser.add_argument('infile', nargs="+", help="WAV file")
     args = parser.parse_args()
 
     if args.outfile is not None and len(args.infile) > 1:
         sys.exit("Can only have one input file if output file is specified.")
 
-    for infile in args.infile:
+    def encode(infile):
         if args.outfile is None:
             outfile = infile.rsplit('.', 1)[0] + '.mp3'
         else:
             outfile = args.outfile
 
-        metadata = get_bwf_core(infile)
-        metadata.update(get_xmp(infile))
+        metadata = BWFRecord(infile)
         if args.cbr:
-            subprocess.call(construct_command(infile, outfile, metadata, None, cbitrate=str(args.cbr)))
+            return subprocess.call(construct_command(infile, outfile, metadata, None, cbitrate=str(args.cbr)))
         else:
-            subprocess.call(construct_command(infile, outfile, metadata, str(args.vbr_level)))
+            return subprocess.call(construct_command(infile, outfile, metadata, str(args.vbr_level)))
+
+    for infile, returncode, error in imap(encode, args.infile, args.jobs):
+        if isinstance(error, (OSError, BWFchunks.NotWaveError)):
+            print("{} does not exist or is not a valid Wave file".format(infile), file=sys.stderr)
+        elif error is not None:
+            print("{}: {}".format(infile, error), file=sys.stderr)
+        elif returncode != 0:
+            print("{}: lame exited with status {}".format(infile, returncode), file=sys.stderr)
 
 
 if __name__ == '__main__':
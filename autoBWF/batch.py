@@ -0,0 +1,62 @@
+"""Run per-file work of the command line tools concurrently.
+
+The per-file work of the batch tools is dominated by subprocesses (lame, bwfmetaedit) and by file IO, neither of
+which holds the GIL, so a thread pool is sufficient to keep all cores busy.
+"""
+
+import collections
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+def add_jobs_argument(parser):
+    """Add the standard "--jobs" option to an argparse.ArgumentParser."""
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="number of files to process concurrently (0 for one per CPU, default 1)")
+
+
+def job_count(jobs):
+    """Translate a "--jobs" value into a number of worker threads."""
+    if jobs is None or jobs < 1:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def imap(func, items, jobs=1):
+    """Apply func to each of items using up to jobs worker threads, yielding the results in input order.
+
+    An exception raised by func is returned rather than raised, so that a failure on one item does not stop the
+    others from being processed. At most a few items per worker are in flight at any time, so the results are
+    yielded as soon as they become available and memory use does not grow with the number of items.
+
+    Args:
+        func (callable): Function of a single argument.
+        items (iterable): The arguments.
+        jobs (int): Number of worker threads (see job_count()).
+
+    Yields:
+        tuple: The item, the value returned by func (or None) and the exception raised by func (or None).
+    """
+
+    def call(item):
+        try:
+            return func(item), None
+        except Exception as e:
+            return None, e
+
+    jobs = job_count(jobs)
+    if jobs == 1:
+        for item in items:
+            yield (item,) + call(item)
+        return
+
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for item in items:
+            pending.append((item, executor.submit(call, item)))
+            if len(pending) >= 4 * jobs:
+                item, future = pending.popleft()
+                yield (item,) + future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield (item,) + future.result()
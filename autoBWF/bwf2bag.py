@@ -0,0 +1,186 @@
+import argparse
+import datetime
+import hashlib
+import itertools
+import os
+import shutil
+import sys
+from os import path
+from autoBWF.BWFfileIO import BWFRecord, default_backend, find_wave_files, iter_bwf_records
+from autoBWF.BWFdigest import cached_digests
+from autoBWF.batch import add_jobs_argument, imap
+
+
+def reflink(source, target):
+    """Create target as a copy-on-write clone of source (on Linux filesystems that support it, e.g. Btrfs or XFS).
+
+    Raises:
+        OSError: If cloning is not supported by the OS or the filesystem.
+    """
+    import fcntl
+
+    ficlone = 0x40049409
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), ficlone, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(target)
+            raise
+
+
+def place(source, target, method="auto"):
+    """Put a payload file into the bag without duplicating its data where possible.
+
+    Args:
+        source (str): The original file.
+        target (str): Its path in the bag.
+        method (str): "link" (hard link), "reflink" (copy-on-write clone), "copy", or "auto" to try each of these in
+            turn.
+
+    Returns:
+        str: The method that was used.
+
+    Raises:
+        OSError: If the file could not be placed with the requested method.
+    """
+
+    os.makedirs(path.dirname(target), exist_ok=True)
+    if method in ["auto", "link"]:
+        try:
+            os.link(source, target)
+            return "link"
+        except (OSError, AttributeError):
+            if method == "link":
+                raise
+    if method in ["auto", "reflink"]:
+        try:
+            reflink(source, target)
+            return "reflink"
+        except (OSError, ImportError):
+            if method == "reflink":
+                raise
+    shutil.copy2(source, target)
+    return "copy"
+
+
+def manifest_path(name):
+    """Encode a bag-relative path as required in BagIt manifests."""
+    return name.replace("%", "%25").replace("\r", "%0D").replace("\n", "%0A")
+
+
+def write_manifest(filename, digests):
+    """Write a BagIt manifest from a dict of hex digests indexed by bag-relative path."""
+    with open(filename, "w", encoding="utf-8", newline="\n") as f:
+        for name in sorted(digests):
+            f.write("{}  {}\n".format(digests[name], manifest_path(name)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Package BWF files as a BagIt bag, reusing stored digests and linking rather than copying files')
+    parser.add_argument('-a', '--algorithm', action="append", choices=["md5", "sha1", "sha256", "sha512"],
+                        help="manifest algorithm (may be repeated; default: md5 and sha256)")
+    parser.add_argument('--method', choices=["auto", "link", "reflink", "copy"], default="auto",
+                        help="how to place payload files in the bag (default: a hard link if possible, otherwise a "
+                             "reflink if possible, otherwise a copy)")
+    parser.add_argument('--info', type=lambda text: text.split(","), default=["ISRC", "owner"],
+                        help="comma-separated list of the fields whose values are listed in bag-info.txt "
+                             "(default: ISRC,owner)")
+    parser.add_argument('--rehash', action="store_true",
+                        help="recompute digests even if they were saved for the unchanged file")
+    parser.add_argument('-r', '--recursive', metavar="DIR", action="append", default=[],
+                        help="include all Wave files in the directory tree DIR, keeping their relative paths")
+    parser.add_argument('--filter', action="store_true",
+                        help="only include files found with --recursive that match the configured filenameRegex")
+    add_jobs_argument(parser)
+    parser.add_argument('bag', help="bag directory to create")
+    parser.add_argument('infile', nargs="*", help="WAV file(s)")
+    args = parser.parse_args()
+
+    if not args.infile and not args.recursive:
+        parser.error("no input files or directories given")
+    unknown = [k for k in args.info if k not in BWFRecord.fields]
+    if unknown:
+        parser.error("unknown field(s): {}".format(", ".join(unknown)))
+    if path.exists(args.bag) and (not path.isdir(args.bag) or os.listdir(args.bag)):
+        parser.error("{} already exists and is not an empty directory".format(args.bag))
+    algorithms = args.algorithm or ["md5", "sha256"]
+
+    pattern = None
+    if args.filter:
+        from autoBWF.autobwfconfig import load_config
+        pattern = load_config()["filenameRegex"]
+
+    # the path of each payload file in the bag
+    payload = {}
+    found = itertools.chain(((infile, path.basename(infile)) for infile in args.infile),
+                            *(((file, path.relpath(file, top)) for file in find_wave_files(top, pattern))
+                              for top in args.recursive))
+    for source, name in found:
+        name = "data/" + name.replace(os.sep, "/")
+        if name in payload:
+            sys.exit("{} and {} would both be stored as {}".format(payload[name], source, name))
+        payload[name] = source
+
+    methods = {}
+    for name, source in payload.items():
+        try:
+            method = place(source, path.join(args.bag, *name.split("/")), args.method)
+        except OSError as e:
+            sys.exit("could not place {} in the bag ({})".format(source, e))
+        methods[method] = methods.get(method, 0) + 1
+    print(", ".join("{} file(s) by {}".format(n, method) for method, n in methods.items()), file=sys.stderr)
+
+    backend = default_backend()._replace(rehash=args.rehash)
+
+    def digests(name):
+        return cached_digests(payload[name], (), algorithms, cache=backend.cache, rehash=backend.rehash)["file"]
+
+    manifests = {algorithm: {} for algorithm in algorithms}
+    failures = 0
+    for name, result, error in imap(digests, sorted(payload), args.jobs):
+        if error is not None:
+            print("{}: could not be hashed ({})".format(payload[name], error), file=sys.stderr)
+            failures += 1
+            continue
+        for algorithm in algorithms:
+            manifests[algorithm][name] = result[algorithm]
+    if failures:
+        sys.exit("the bag is incomplete")
+
+    info = {k: [] for k in args.info}
+    for infile, metadata, error in iter_bwf_records(sorted(payload.values()), fields=args.info, jobs=args.jobs,
+                                                    backend=backend):
+        if error is not None:
+            print("{}: could not read metadata ({})".format(infile, error), file=sys.stderr)
+            continue
+        for k in args.info:
+            value = " ".join((metadata[k] or "").split())
+            if value and value not in info[k]:
+                info[k].append(value)
+
+    with open(path.join(args.bag, "bagit.txt"), "w", encoding="utf-8", newline="\n") as f:
+        f.write("BagIt-Version: 1.0\nTag-File-Character-Encoding: UTF-8\n")
+    octets = sum(os.path.getsize(source) for source in payload.values())
+    with open(path.join(args.bag, "bag-info.txt"), "w", encoding="utf-8", newline="\n") as f:
+        f.write("Bagging-Date: {}\n".format(datetime.date.today().isoformat()))
+        f.write("Bag-Software-Agent: autoBWF bwf2bag\n")
+        f.write("Payload-Oxum: {}.{}\n".format(octets, len(payload)))
+        for k in args.info:
+            for value in info[k]:
+                f.write("{}: {}\n".format(k, value))
+    for algorithm in algorithms:
+        write_manifest(path.join(args.bag, "manifest-{}.txt".format(algorithm)), manifests[algorithm])
+
+    tags = ["bagit.txt", "bag-info.txt"] + ["manifest-{}.txt".format(algorithm) for algorithm in algorithms]
+    for algorithm in algorithms:
+        tag_digests = {}
+        for tag in tags:
+            with open(path.join(args.bag, tag), "rb") as f:
+                tag_digests[tag] = hashlib.new(algorithm, f.read()).hexdigest()
+        write_manifest(path.join(args.bag, "tagmanifest-{}.txt".format(algorithm)), tag_digests)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,52 +1,267 @@
 import argparse
 import csv
+import itertools
+import json
+import sqlite3
+import tempfile
 import sys
 import xml.etree.ElementTree
 from os import path
 from autoBWF.BWFfileIO import *
+from autoBWF.batch import add_jobs_argument
+from autoBWF import sinks
+
+# number of rows after which the output file is flushed and the manifest committed
+checkpoint_rows = 1000
+
+
+class Manifest:
+    """Index of the files already written to a CSV output file, stored in an SQLite database next to it.
+
+    Each file is recorded with its size and modification time, so that re-runs over the same files can skip
+    those that have not changed since they were last extracted. Recorded files are only committed to the manifest
+    by commit() or close(), which must not be called before their rows have reached the output file; otherwise an
+    interrupted run could leave files listed in the manifest that are missing from the output.
+    """
+
+    def __init__(self, outfile):
+        self.db = sqlite3.connect(outfile + ".manifest")
+        self.db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER)")
+
+    @staticmethod
+    def key(filename):
+        st = os.stat(filename)
+        return os.path.realpath(filename), st.st_size, st.st_mtime_ns
+
+    def unchanged(self, filename):
+        """Return True if filename is listed with its current size and modification time."""
+        try:
+            key = self.key(filename)
+        except OSError:
+            return False
+        return self.db.execute("SELECT 1 FROM files WHERE path=? AND size=? AND mtime_ns=?", key).fetchone() is not None
+
+    def record(self, filename):
+        try:
+            self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", self.key(filename))
+        except OSError:
+            pass
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+class UpsertWriter:
+    """Drop-in replacement for csv.DictWriter that updates an existing bwf2csv output file in place of appending.
+
+    Rows are staged in a temporary on-disk SQLite database rather than in memory. When the writer is closed, the
+    existing file is rewritten: each of its rows is replaced by the new row with the same key (if any), rows with
+    duplicate keys (e.g. from earlier appends) are reduced to the last one, and the remaining new rows are appended.
+    Rows with an empty key (e.g. files without an OriginalFilename) identify nothing, so they are always kept.
+    The rewritten file is written next to the original and then renamed over it, so that it is replaced atomically.
+
+    Args:
+        outfile (str): The existing CSV file.
+        fieldnames (list): The output fields of the new rows.
+        key (str): The field identifying a row, e.g. "filename" or "OriginalFilename".
+
+    Raises:
+        ValueError: If the existing file has rows but no key column.
+    """
+
+    def __init__(self, outfile, fieldnames, key):
+        with open(outfile, newline='') as f:
+            existing = csv.DictReader(f).fieldnames
+        if existing and key not in existing:
+            raise ValueError("{} has no {} column to match rows by".format(outfile, key))
+
+        self.outfile = outfile
+        self.fieldnames = fieldnames
+        self.key = key
+        self.db = sqlite3.connect("")
+        self.db.execute("CREATE TABLE new (seq INTEGER PRIMARY KEY, key TEXT UNIQUE, row TEXT)")
+        self.db.execute("CREATE TABLE old (key TEXT PRIMARY KEY, last INTEGER)")
+
+    def writerow(self, row):
+        # a NULL key never conflicts, so rows with an empty key are all kept
+        self.db.execute("INSERT OR REPLACE INTO new (key, row) VALUES (?, ?)", (row[self.key] or None, json.dumps(row)))
+
+    def close(self):
+        with open(self.outfile, newline='') as f:
+            reader = csv.DictReader(f)
+            for number, row in enumerate(reader):
+                if row.get(self.key):
+                    self.db.execute("INSERT OR REPLACE INTO old VALUES (?, ?)", (row[self.key], number))
+            fieldnames = reader.fieldnames or []
+
+        fieldnames = fieldnames + [k for k in self.fieldnames if k not in fieldnames]
+        fd, tmpfile = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.outfile)), suffix=".csv")
+        try:
+            with open(self.outfile, newline='') as f, os.fdopen(fd, 'w', newline='') as out:
+                writer = csv.DictWriter(out, fieldnames, extrasaction='ignore')
+                writer.writeheader()
+                for number, row in enumerate(csv.DictReader(f)):
+                    key = row.get(self.key)
+                    if not key:
+                        writer.writerow(row)
+                        continue
+                    if self.db.execute("SELECT last FROM old WHERE key=?", (key,)).fetchone()[0] != number:
+                        continue
+                    new = self.db.execute("SELECT seq, row FROM new WHERE key=?", (key,)).fetchone()
+                    if new is not None:
+                        writer.writerow(json.loads(new[1]))
+                        self.db.execute("DELETE FROM new WHERE seq=?", (new[0],))
+                    else:
+                        writer.writerow(row)
+                for (row,) in self.db.execute("SELECT row FROM new ORDER BY seq"):
+                    writer.writerow(json.loads(row))
+            os.chmod(tmpfile, os.stat(self.outfile).st_mode)
+            os.replace(tmpfile, self.outfile)
+        except BaseException:
+            os.remove(tmpfile)
+            raise
+        finally:
+            self.db.close()
 
 
 def main():
     parser = argparse.ArgumentParser(
         description='Extract metadata from BWF into a CSV file')
-    parser.add_argument('--digest', help="Verify MD5 digest of data chunk", action="store_true")
+    parser.add_argument('--digest', action="store_true",
+                        help="Verify MD5 digest of data chunk (a digest saved by an earlier run is reused while the "
+                             "file's size and modification time are unchanged, unless --rehash is given)")
+    parser.add_argument('--rehash', action="store_true",
+                        help="with --digest, recompute digests by reading the files even if they were saved for the "
+                             "unchanged file (e.g. for fixity checks)")
     parser.add_argument('-o', dest="outfile", help="CSV output file")
-    parser.add_argument('infile', nargs="+", help="WAV file(s)")
+    parser.add_argument('--fields', type=lambda text: text.split(","),
+                        help="comma-separated list of the fields to output (only the metadata needed for these "
+                             "fields are extracted)")
+    parser.add_argument('-f', '--format', choices=sinks.formats,
+                        help="output format (by default, guessed from the output file extension, otherwise csv)")
+    parser.add_argument('--upsert', nargs="?", const="filename", choices=["filename", "OriginalFilename"],
+                        help="replace the rows of an existing output file that have the same filename (or "
+                             "OriginalFilename) instead of appending duplicates")
+    parser.add_argument('-r', '--recursive', metavar="DIR", action="append", default=[],
+                        help="extract metadata from all Wave files in the directory tree DIR")
+    parser.add_argument('--filter', action="store_true",
+                        help="only include files found with --recursive that match the configured filenameRegex")
+    parser.add_argument('--catalogue', nargs="?", const="", metavar="DB",
+                        help="take the metadata of unchanged files from the catalogue (see bwfquery), and add the "
+                             "other files to it (default DB: in the autoBWF data directory)")
+    add_jobs_argument(parser)
+    parser.add_argument('infile', nargs="*", help="WAV file(s)")
     args = parser.parse_args()
 
+    if not args.infile and not args.recursive:
+        parser.error("no input files or directories given")
+    output_format = args.format or sinks.guess_format(args.outfile)
+    if args.upsert and output_format != "csv":
+        parser.error("--upsert is only supported for CSV output (SQLite output always replaces earlier rows)")
+    if args.outfile is None and output_format in ["sqlite", "parquet"]:
+        parser.error("{} output requires an output file (-o)".format(output_format))
+
+    pattern = None
+    if args.filter:
+        from autoBWF.autobwfconfig import load_config
+        pattern = load_config()["filenameRegex"]
+    infiles = itertools.chain(args.infile, *(find_wave_files(top, pattern) for top in args.recursive))
+
     output_fields = ["filename", "OriginalFilename", "FileContent", "FileUse", "INAM", "ICRD", "form", "Duration",
                      "language", "ISRC", "creator", "xmp_description", "interviewer", "interviewee", "host", "speaker",
                      "performer", "topics", "names", "events", "places", "owner", "ICOP", "ICMT", "MD5Stored",
                      "OriginationDate", "OriginationTime"]
 
-    if args.digest:
+    if args.fields is not None:
+        unknown = [k for k in args.fields if k not in BWFRecord.fields]
+        if unknown:
+            parser.error("unknown field(s): {}".format(", ".join(unknown)))
+        output_fields = args.fields
+    elif args.digest:
         output_fields.extend(["MD5Generated", "Errors"])
+    if output_format == "sqlite" and "filename" not in output_fields:
+        parser.error("SQLite output requires filename to be one of the output fields")
+    if args.upsert and args.upsert not in output_fields:
+        parser.error("--upsert {0} requires {0} to be one of the output fields".format(args.upsert))
 
-    if args.outfile is not None:
-        if os.path.isfile(args.outfile):
-            # if file exists, assume that it is a bwf2csv output file, append rows without generating header
-            output = csv.DictWriter(open(args.outfile, 'a'), output_fields)
-        else:
-            # otherwise, create new file and generate header
-            output = csv.DictWriter(open(args.outfile, 'w'), output_fields)
-            output.writeheader()
-    else:
+    # if the output file exists, assume that it is a bwf2csv output file and add to it (Parquet files cannot be
+    # appended to, so they are always regenerated from scratch)
+    appending = args.outfile is not None and os.path.isfile(args.outfile) and output_format != "parquet"
+
+    outfh = None
+    if output_format != "csv":
+        try:
+            output = sinks.open_sink(output_format, args.outfile, output_fields)
+        except ImportError as e:
+            sys.exit("{} output requires a package that is not installed ({})".format(output_format, e))
+    elif args.outfile is None:
         output = csv.DictWriter(sys.stdout, output_fields)
         output.writeheader()
-
-    for infile in args.infile:
+    elif appending and args.upsert:
         try:
-            metadata = get_bwf_core(infile)
-            metadata["filename"] = infile
-            if args.digest:
-                metadata.update(get_bwf_tech(infile, verify_digest=True))
-            else:
-                metadata.update(get_bwf_tech(infile))
-            metadata.update(get_xmp(infile))
-            output.writerow({k: metadata[k] for k in output_fields})
-        except xml.etree.ElementTree.ParseError:
-            print("while parsing {}".format(infile))
-            raise
+            output = UpsertWriter(args.outfile, output_fields, args.upsert)
+        except ValueError as e:
+            parser.error(str(e))
+    elif appending:
+        # append rows without generating header
+        outfh = open(args.outfile, 'a')
+        output = csv.DictWriter(outfh, output_fields)
+    else:
+        # otherwise, create new file and generate header
+        outfh = open(args.outfile, 'w')
+        output = csv.DictWriter(outfh, output_fields)
+        output.writeheader()
+
+    # the manifest is committed whenever the rows written so far are known to be in the output file (which for
+    # --upsert and Parquet output is only the case once it has been closed)
+    if outfh is not None:
+        flush = outfh.flush
+    elif isinstance(output, (sinks.JsonLinesSink, sinks.SQLiteSink)):
+        flush = output.flush
+    else:
+        flush = None
+
+    manifest = None
+    if args.outfile is not None:
+        if not appending and os.path.exists(args.outfile + ".manifest"):
+            os.remove(args.outfile + ".manifest")
+        manifest = Manifest(args.outfile)
+        if appending:
+            # skip the files that the output file already lists (unless they have changed since)
+            infiles = (infile for infile in infiles if not manifest.unchanged(infile))
+
+    backend = default_backend()._replace(rehash=args.rehash)
+    if args.catalogue is not None:
+        from autoBWF.BWFcatalogue import Catalogue
+        backend = backend._replace(catalogue=Catalogue(args.catalogue or None))
+    records = iter_bwf_records(infiles, fields=output_fields, verify_digest=args.digest, jobs=args.jobs,
+                               backend=backend)
+    written = 0
+    for infile, metadata, error in records:
+        if isinstance(error, xml.etree.ElementTree.ParseError):
+            print("{}: could not parse XMP ({})".format(infile, error), file=sys.stderr)
+            continue
+        elif error is not None:
+            print("{} does not exist or is not a valid Wave file".format(infile), file=sys.stderr)
+            continue
+        output.writerow({k: metadata[k] for k in output_fields})
+        if manifest is not None:
+            manifest.record(infile)
+            written += 1
+            if flush is not None and written % checkpoint_rows == 0:
+                flush()
+                manifest.commit()
+
+    if outfh is not None:
+        outfh.close()
+    elif not isinstance(output, csv.DictWriter):
+        output.close()
+    if manifest is not None:
+        manifest.close()
 
 
 if __name__ == '__main__':
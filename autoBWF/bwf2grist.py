@@ -1,41 +1,34 @@
 import sys
 from os import path
 from pathlib import Path
-import subprocess
 import logging
 from logging.config import dictConfig
 from datetime import datetime, timezone
-import hashlib
 
 import click
 import requests
 
-from autoBWF.BWFfileIO import get_bwf_tech
-from autoBWF.BWFfileIO import get_bwf_core
-
-# Source - https://stackoverflow.com/a/3431838
-# Posted by quantumSoup, modified by community. See post 'Timeline' for change history
-# Retrieved 2026-03-19, License - CC BY-SA 4.0
-
-def md5(fname):
-    hash_md5 = hashlib.md5()
-    with open(fname, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+from autoBWF.BWFfileIO import iter_bwf_core_and_tech, default_backend
+from autoBWF.BWFdigest import cached_digests
 
 
 @click.command()
 @click.option('--key', envvar='GRIST_KEY', help="provide Grist API key")
 @click.option('--doc-id', envvar='GRIST_DOC_ID', help="provide Grist document ID")
-@click.option('--digest', is_flag=True, help="verify MD5 digest of data chunk (may be very slow)")
-@click.option('--file-digest', is_flag=True, help="calculate and save MD5 digest of the entire wav file (may be very slow)")
+@click.option('--digest', is_flag=True,
+              help="verify MD5 digest of data chunk (may be very slow; a digest saved by an earlier run is reused "
+                   "while the file's size and modification time are unchanged, unless --rehash is given)")
+@click.option('--file-digest', is_flag=True,
+              help="calculate and save MD5 digest of the entire wav file (may be very slow; reused like --digest)")
+@click.option('--rehash', is_flag=True,
+              help="recalculate digests by reading the files even if they were saved for the unchanged file by an "
+                   "earlier run (e.g. for fixity checks)")
 @click.option('-y', '--yes', is_flag=True, help="Assume 'yes' as answer to all prompts")
 @click.option('--dry-run', is_flag=True,
               help="Simulate Grist actions, but don't actually make changes in Grist")
 @click.option('-q', '--quiet', is_flag=True, help='turn off logging to stderr')
 @click.argument('files', nargs=-1)
-def cli(key, doc_id, digest, file_digest, yes, dry_run, quiet, files):
+def cli(key, doc_id, digest, file_digest, rehash, yes, dry_run, quiet, files):
     """
     bwf2grist is a tool to interact with the Grist (getgrist.com) API to create, update, or validated rows(s) in a
     table of PBCore Digital Instantiations based on a BWF file.
@@ -91,18 +84,22 @@ def cli(key, doc_id, digest, file_digest, yes, dry_run, quiet, files):
     tables_base_url = f"{base_url}/docs/{doc_id}/tables"
     headers = {"Authorization": f"Bearer {key}"}
 
-    for infile in files:
-        try:
-            metadata = get_bwf_core(infile)
-            metadata["filename"] = infile
+    backend = default_backend()._replace(rehash=rehash)
+
+    # if both digests are needed, they are computed together below, in a single read of the file
+    for infile, core, tech in iter_bwf_core_and_tech(files, verify_digest=digest and not file_digest, backend=backend):
+        if core is None or tech is None:
+            continue
+        metadata = core
+        metadata["filename"] = infile
+        metadata.update(tech)
+        if file_digest:
+            digests = cached_digests(infile, data_algorithms=["md5"] if digest else [], file_algorithms=["md5"],
+                                     cache=backend.cache, rehash=rehash)
             if digest:
-                metadata.update(get_bwf_tech(infile, verify_digest=True))
-                if metadata["MD5Stored"] != metadata["MD5Generated"]:
-                    logger.error('Calculated and stored MD5 digests for %s do not match', infile)
-                    continue
-            else:
-                metadata.update(get_bwf_tech(infile))
-        except subprocess.CalledProcessError:
+                metadata["MD5Generated"] = digests["data"]["md5"]
+        if digest and metadata["MD5Stored"] != metadata["MD5Generated"]:
+            logger.error('Calculated and stored MD5 digests for %s do not match', infile)
             continue
 
         if metadata["OriginalFilename"] != "":
@@ -136,7 +133,7 @@ def cli(key, doc_id, digest, file_digest, yes, dry_run, quiet, files):
         metadata["BitPerSample"] = int(metadata["BitPerSample"])
 
         if file_digest:
-            metadata["FileMD5"] = md5(infile)
+            metadata["FileMD5"] = digests["file"]["md5"]
 
         if len(records) == 0:
             logger.debug("creating new digital instantiation %s", identifier)
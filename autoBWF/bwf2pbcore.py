@@ -5,6 +5,7 @@ import xml.etree.ElementTree as ET
 from os import path
 from autoBWF.BWFfileIO import *
 from autoBWF.label2ohms import create_ohms
+from autoBWF.batch import add_jobs_argument, imap
 
 namespaces = {"xml": "http://www.w3.org/XML/1998/namespace",
               "pbcore": "http://www.pbcore.org/PBCore/PBCoreNamespace.html",
@@ -161,25 +162,40 @@ def main():
     parser = argparse.ArgumentParser(
         description='Extract metadata from BWF and create PBCore XML, incorporating existing OHMS XML as an extension')
     parser.add_argument('--ohms', dest='ohmsfile', help='OHMS XML file')
+    parser.add_argument('--catalogue', nargs="?", const="", metavar="DB",
+                        help="take the metadata of unchanged files from the catalogue (see bwfquery), and add the "
+                             "other files to it (default DB: in the autoBWF data directory)")
+    add_jobs_argument(parser)
     parser.add_argument('infile', nargs="+", help="WAV file(s)")
     args = parser.parse_args()
 
     if args.ohmsfile is not None and len(args.infile) > 1:
         sys.exit("Can only have one input file if OHMS file is specified.")
 
-    for infile in args.infile:
+    backend = None
+    if args.catalogue is not None:
+        from autoBWF.BWFcatalogue import Catalogue
+        backend = default_backend()._replace(catalogue=Catalogue(args.catalogue or None))
+
+    def export(infile):
         if args.ohmsfile is not None:
             ohmsfile = args.ohmsfile
         else:
             ohmsfile = infile.rsplit('.', 1)[0] + '_ohms.xml'
         outfile = infile.rsplit('.', 1)[0] + '_pbcore.xml'
 
-        metadata = get_bwf_core(infile)
-        metadata.update(get_bwf_tech(infile))
-        metadata.update(get_xmp(infile))
+        metadata = BWFRecord(infile, backend=backend)
 
         write_pbcore(outfile, metadata, infile, ohmsfile)
 
+    for infile, _, error in imap(export, args.infile, args.jobs):
+        if isinstance(error, (OSError, BWFchunks.NotWaveError)):
+            print("{} does not exist or is not a valid Wave file".format(infile), file=sys.stderr)
+        elif isinstance(error, IllFormedXML):
+            print("{}: the OHMS file is not well-formed XML".format(infile), file=sys.stderr)
+        elif error is not None:
+            print("{}: {}".format(infile, error), file=sys.stderr)
+
 
 if __name__ == '__main__':
     main()
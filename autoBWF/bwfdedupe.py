@@ -0,0 +1,105 @@
+import argparse
+import csv
+import itertools
+import sys
+from autoBWF.BWFfileIO import BWFRecord, default_backend, find_wave_files
+from autoBWF.BWFdigest import cached_digests, sampled_data_digest
+from autoBWF.batch import add_jobs_argument, imap
+from autoBWF import BWFchunks
+
+
+def audio_format(filename):
+    """Return the size of the data chunk and the contents of the fmt chunk of a Wave file (reading only its headers).
+
+    Raises:
+        BWFchunks.NotWaveError: If filename is not a RIFF/WAVE file.
+        ValueError: If the file has no data or fmt chunk.
+    """
+
+    with BWFchunks.WaveFile(filename) as wave:
+        data, fmt = wave.find("data"), wave.find("fmt ")
+        if data is None or fmt is None:
+            raise ValueError("no data or fmt chunk")
+        return min(data.size, wave.stat.st_size - data.offset), wave.read(fmt)
+
+
+def refine(groups, func, jobs=1):
+    """Split each group of files by the value of func for each file, keeping only the groups of two or more files.
+
+    Files for which func raises an exception are reported and dropped.
+
+    Args:
+        groups (iterable): Lists of filenames.
+        func (callable): Function of a filename.
+        jobs (int): Number of files processed concurrently.
+
+    Returns:
+        list: The lists of filenames that share a value of func, as (value, filenames) tuples.
+    """
+
+    def keyed(groups):
+        for number, files in enumerate(groups):
+            for file in files:
+                yield number, file
+
+    refined = {}
+    for (number, file), value, error in imap(lambda item: func(item[1]), keyed(groups), jobs):
+        if error is not None:
+            print("{}: {}".format(file, error), file=sys.stderr)
+            continue
+        refined.setdefault((number, value), []).append(file)
+    return [(key[1], files) for key, files in refined.items() if len(files) > 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Find BWF files with identical audio data')
+    parser.add_argument('-o', dest="outfile", help="CSV output file (default: stdout)")
+    parser.add_argument('--samples', type=int, default=8,
+                        help="number of pseudo-random blocks of the audio data compared before files are hashed in "
+                             "full (default: 8)")
+    parser.add_argument('--rehash', action="store_true",
+                        help="recompute digests even if they were saved for the unchanged file")
+    parser.add_argument('--filter', action="store_true",
+                        help="only include files that match the configured filenameRegex")
+    add_jobs_argument(parser)
+    parser.add_argument('directory', nargs="+", help="directory tree to search")
+    args = parser.parse_args()
+
+    pattern = None
+    if args.filter:
+        from autoBWF.autobwfconfig import load_config
+        pattern = load_config()["filenameRegex"]
+    files = list(itertools.chain(*(find_wave_files(top, pattern) for top in args.directory)))
+    backend = default_backend()._replace(rehash=args.rehash)
+
+    # Only files with the same audio data size and format can be duplicates, which is known from their headers.
+    # Of those, only files with the same sampled blocks are hashed in full (unless their digest is already stored).
+    candidates = refine([files], audio_format, args.jobs)
+    print("{} files, {} with the same size and format as another".format(
+        len(files), sum(len(group) for _, group in candidates)), file=sys.stderr)
+    candidates = refine((group for _, group in candidates),
+                        lambda file: sampled_data_digest(file, args.samples), args.jobs)
+    print("{} with the same sampled audio data as another".format(
+        sum(len(group) for _, group in candidates)), file=sys.stderr)
+    duplicates = refine((group for _, group in candidates),
+                        lambda file: cached_digests(file, cache=backend.cache, rehash=args.rehash)["data"]["md5"],
+                        args.jobs)
+    print("{} sets of files with identical audio data".format(len(duplicates)), file=sys.stderr)
+
+    output_fields = ["set", "md5", "filename", "OriginalFilename", "FileContent"]
+    output = csv.DictWriter(open(args.outfile, "w", newline="") if args.outfile else sys.stdout, output_fields)
+    output.writeheader()
+    for number, (md5, group) in enumerate(sorted(duplicates, key=lambda duplicate: sorted(duplicate[1])), 1):
+        for file in sorted(group):
+            row = {"set": number, "md5": md5, "filename": file, "OriginalFilename": "", "FileContent": ""}
+            try:
+                metadata = BWFRecord(file, backend=backend)
+                row.update(OriginalFilename=metadata["OriginalFilename"], FileContent=metadata["FileContent"])
+            except (OSError, BWFchunks.NotWaveError) as e:
+                print("{}: could not read metadata ({})".format(file, e), file=sys.stderr)
+            output.writerow(row)
+
+
+if __name__ == '__main__':
+    main()
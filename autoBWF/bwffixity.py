@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from autoBWF.BWFfileIO import find_wave_files
+from autoBWF import BWFchunks, BWFdigest
+
+
+def data_file(name):
+    """Return the path of a file in the autoBWF user data directory appropriate to the OS."""
+    from appdirs import AppDirs
+
+    directory = AppDirs("autoBWF", "UHEC").user_data_dir
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+class FixityState:
+    """The verification history of the archive, stored in an SQLite database.
+
+    Every file is recorded with the time at which it was last verified, so that each run verifies the files that
+    were verified longest ago (or never) first. The state is committed after every file, so that an interrupted
+    run loses at most the file that was being verified. Along with the digests, the quick fingerprint of each file
+    (see autoBWF.BWFdigest.fingerprint()) at the time of its last verification is recorded.
+    """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS files (
+                               path TEXT PRIMARY KEY,
+                               size INTEGER, mtime_ns INTEGER,
+                               last_verified REAL,
+                               status TEXT,
+                               stored TEXT, generated TEXT,
+                               fingerprint TEXT, samples INTEGER)""")
+        existing = [row[1] for row in self.db.execute("PRAGMA table_info(files)")]
+        for column, column_type in [("fingerprint", "TEXT"), ("samples", "INTEGER")]:
+            if column not in existing:
+                self.db.execute("ALTER TABLE files ADD COLUMN {} {}".format(column, column_type))
+        self.db.execute("CREATE INDEX IF NOT EXISTS files_last_verified ON files (last_verified)")
+
+    def register(self, files):
+        """Add files that are not yet known (as never verified)."""
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO files (path) VALUES (?)",
+                                ((os.path.abspath(file),) for file in files))
+
+    def queue(self, verified_before):
+        """Yield the paths of the files not verified since verified_before, least recently verified first."""
+        query = """SELECT path FROM files WHERE last_verified IS NULL OR last_verified < ?
+                   ORDER BY last_verified IS NOT NULL, last_verified"""
+        for (path,) in self.db.execute(query, (verified_before,)).fetchall():
+            yield path
+
+    def known(self, path):
+        """Return the size, modification time, fingerprint and number of samples recorded for path (or Nones)."""
+        row = self.db.execute("SELECT size, mtime_ns, fingerprint, samples FROM files WHERE path=?", (path,)).fetchone()
+        return row if row is not None else (None, None, None, None)
+
+    def record(self, path, result):
+        with self.db:
+            self.db.execute("""UPDATE files SET size=?, mtime_ns=?, last_verified=?, status=?, stored=?, generated=?,
+                                                fingerprint=?, samples=?
+                               WHERE path=?""",
+                            (result["size"], result["mtime_ns"], result["time"], result["status"],
+                             result["stored"], result["generated"], result["fingerprint"], result["samples"], path))
+
+    def flag(self, path, status):
+        """Mark path as never verified, so that the next full run verifies it first."""
+        with self.db:
+            self.db.execute("UPDATE files SET last_verified=NULL, status=? WHERE path=?", (status, path))
+
+    def close(self):
+        self.db.close()
+
+
+def verify(path, throttle=None, samples=8):
+    """Verify the data chunk of a Wave file against its MD5 chunk, and compute its fingerprint.
+
+    Returns:
+        dict: The journal entry for the file. Its "status" is "ok", "failed" (the digests differ), "no digest" (the
+            file has no MD5 chunk), "missing" or "error". If the verification failed and the file has a tree digest
+            (see autoBWF.BWFdigest.tree_digest()), the damaged byte ranges of the data chunk are listed in "damaged".
+    """
+
+    result = {"time": time.time(), "path": path, "size": None, "mtime_ns": None, "stored": "", "generated": "",
+              "fingerprint": None, "samples": samples, "status": "ok"}
+    try:
+        st = os.stat(path)
+        result["size"] = st.st_size
+        result["mtime_ns"] = st.st_mtime_ns
+        result["stored"] = BWFchunks.read_metadata(path)["MD5Stored"]
+        result["generated"] = BWFdigest.file_digests(path, throttle=throttle)["data"]["md5"]
+        result["fingerprint"] = BWFdigest.fingerprint(path, samples, throttle)
+    except FileNotFoundError:
+        result["status"] = "missing"
+        return result
+    except (OSError, BWFchunks.NotWaveError) as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+        return result
+
+    if result["stored"] == "":
+        result["status"] = "no digest"
+    elif result["stored"] != result["generated"]:
+        result["status"] = "failed"
+        try:
+            if BWFdigest.read_tree(path) is not None:
+                result["damaged"] = BWFdigest.verify_tree(path, throttle=throttle)
+        except (OSError, ValueError, BWFchunks.NotWaveError):
+            pass
+    return result
+
+
+def quick_check(path, known, throttle=None):
+    """Compare the current fingerprint of a Wave file with the one recorded at its last full verification.
+
+    Args:
+        path (str): The name of the Wave file.
+        known (tuple): As returned by FixityState.known().
+        throttle (BWFdigest.Throttle): Rate limit for reading the file.
+
+    Returns:
+        dict: The journal entry for the file. Its "status" is "unchanged", "changed" (the size, modification time
+            or fingerprint differ), "unverified" (there is no recorded fingerprint), "missing" or "error".
+    """
+
+    size, mtime_ns, recorded, samples = known
+    result = {"time": time.time(), "path": path, "size": None, "mtime_ns": None, "fingerprint": None,
+              "samples": samples, "status": "unchanged"}
+    if recorded is None:
+        result["status"] = "unverified"
+        return result
+    try:
+        st = os.stat(path)
+        result["size"] = st.st_size
+        result["mtime_ns"] = st.st_mtime_ns
+        result["fingerprint"] = BWFdigest.fingerprint(path, samples, throttle)
+    except FileNotFoundError:
+        result["status"] = "missing"
+        return result
+    except (OSError, BWFchunks.NotWaveError) as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+        return result
+
+    if (result["size"], result["mtime_ns"], result["fingerprint"]) != (size, mtime_ns, recorded):
+        result["status"] = "changed"
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Verify the embedded MD5 digests of all BWF files in an archive, oldest verification first')
+    parser.add_argument('--limit', type=float, default=0, metavar="MB/S",
+                        help="maximum read rate in MB/s (default: no limit)")
+    parser.add_argument('--interval', type=float, default=1, metavar="DAYS",
+                        help="skip files that have been verified within this many days (default: 1)")
+    parser.add_argument('--max-time', type=float, metavar="MINUTES",
+                        help="stop after this many minutes (the next run resumes where this one stopped)")
+    parser.add_argument('--quick', action="store_true",
+                        help="only compare the fingerprint of each file with the one recorded at its last "
+                             "verification, and flag the files that changed for full verification")
+    parser.add_argument('--samples', type=int, default=8,
+                        help="number of sampled blocks of the audio data in the fingerprint of newly verified files "
+                             "(default: 8)")
+    parser.add_argument('--filter', action="store_true",
+                        help="only include files that match the configured filenameRegex")
+    parser.add_argument('--state', help="verification state database (default: in the autoBWF data directory)")
+    parser.add_argument('--journal',
+                        help="JSON Lines file to which results are appended (default: in the autoBWF data directory)")
+    parser.add_argument('directory', nargs="+", help="root directory of the archive")
+    args = parser.parse_args()
+
+    pattern = None
+    if args.filter:
+        from autoBWF.autobwfconfig import load_config
+        pattern = load_config()["filenameRegex"]
+
+    state = FixityState(args.state or data_file("fixity.sqlite"))
+    journal = open(args.journal or data_file("fixity.jsonl"), "a")
+    throttle = BWFdigest.Throttle(args.limit * 1e6) if args.limit > 0 else None
+
+    for top in args.directory:
+        state.register(find_wave_files(top, pattern))
+
+    # Since the least recently verified files come first and each result is committed immediately, a run that
+    # is interrupted (or stopped by --max-time) is resumed by the next one, which skips the files that have just
+    # been verified.
+    # A quick check covers all files.
+    verified_before = time.time() - args.interval * 86400 if not args.quick else float("inf")
+    roots = [os.path.abspath(top) + os.sep for top in args.directory]
+    deadline = time.monotonic() + args.max_time * 60 if args.max_time else None
+    failures = 0
+    try:
+        for path in state.queue(verified_before):
+            if not any(path.startswith(root) for root in roots):
+                continue
+            if deadline is not None and time.monotonic() > deadline:
+                print("time limit reached; the next run will resume the audit", file=sys.stderr)
+                break
+            if args.quick:
+                result = quick_check(path, state.known(path), throttle)
+                if result["status"] in ["changed", "missing", "error"]:
+                    state.flag(path, result["status"])
+            else:
+                result = verify(path, throttle, args.samples)
+                state.record(path, result)
+            journal.write(json.dumps(result) + "\n")
+            journal.flush()
+            if result["status"] not in ["ok", "no digest", "unchanged", "unverified"]:
+                failures += 1
+                message = "{}: {} ({})".format(path, result["status"],
+                                               datetime.fromtimestamp(result["time"]).isoformat(timespec="seconds"))
+                if result.get("damaged"):
+                    message += ", damaged data bytes " + ", ".join("{}-{}".format(*r) for r in result["damaged"])
+                print(message, file=sys.stderr)
+    except KeyboardInterrupt:
+        print("interrupted; the next run will resume the audit", file=sys.stderr)
+    finally:
+        journal.close()
+        state.close()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
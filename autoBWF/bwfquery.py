@@ -0,0 +1,103 @@
+import argparse
+import csv
+import itertools
+import re
+import sqlite3
+import sys
+from autoBWF.BWFfileIO import find_wave_files
+from autoBWF.BWFcatalogue import Catalogue
+from autoBWF.batch import add_jobs_argument
+
+_condition = re.compile(r"^(.+?)(!=|>=|<=|=|<|>|~)(.*)$", re.DOTALL)
+
+
+def parse_condition(text, fields):
+    """Translate a condition such as "FileUse=PM" into an SQL expression and its parameter.
+
+    The operators are =, !=, <, >, <=, >= (comparing the text of the field) and ~ (the field contains the text,
+    ignoring case).
+
+    Raises:
+        ValueError: If the condition cannot be parsed or refers to an unknown field.
+    """
+
+    match = _condition.match(text)
+    if match is None:
+        raise ValueError("invalid condition {} (expected FIELD=VALUE, FIELD~TEXT, ...)".format(text))
+    field, operator, value = match.groups()
+    if field not in fields:
+        raise ValueError("unknown field {}".format(field))
+    column = '"path"' if field == "filename" else '"{}"'.format(field)
+    if operator == "~":
+        return "{} LIKE ? ESCAPE '\\'".format(column), "%" + re.sub(r"([%_\\])", r"\\\1", value) + "%"
+    return "{} {} ?".format(column, operator), value
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Search the catalogue of BWF metadata, optionally updating it first')
+    parser.add_argument('--catalogue', help="catalogue database (default: in the autoBWF data directory)")
+    parser.add_argument('-u', '--update', metavar="DIR", action="append", default=[],
+                        help="add the new and changed Wave files in the directory tree DIR to the catalogue")
+    parser.add_argument('--filter', action="store_true",
+                        help="only catalogue files found with --update that match the configured filenameRegex")
+    parser.add_argument('--prune', action="store_true", help="remove files that no longer exist from the catalogue")
+    parser.add_argument('--fields', type=lambda text: text.split(","),
+                        default=["filename", "OriginalFilename", "FileUse", "INAM"],
+                        help="comma-separated list of the fields to output (default: filename,OriginalFilename,"
+                             "FileUse,INAM)")
+    parser.add_argument('--where', help="additional SQL condition on the columns of the catalogue")
+    parser.add_argument('--count', action="store_true", help="only output the number of matching files")
+    add_jobs_argument(parser)
+    parser.add_argument('condition', nargs="*",
+                        help="FIELD=VALUE, FIELD!=VALUE, FIELD<VALUE, FIELD>VALUE, FIELD<=VALUE, FIELD>=VALUE or "
+                             "FIELD~TEXT (FIELD contains TEXT, ignoring case); all conditions must hold")
+    args = parser.parse_args()
+
+    catalogue = Catalogue(args.catalogue)
+    fields = ["filename"] + catalogue.fields
+    unknown = [k for k in args.fields if k not in fields]
+    if unknown:
+        parser.error("unknown field(s): {}".format(", ".join(unknown)))
+    try:
+        conditions = [parse_condition(text, fields) for text in args.condition]
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.update:
+        pattern = None
+        if args.filter:
+            from autoBWF.autobwfconfig import load_config
+            pattern = load_config()["filenameRegex"]
+        files = itertools.chain(*(find_wave_files(top, pattern) for top in args.update))
+        updated = 0
+        for infile, _, error in catalogue.update(files, jobs=args.jobs):
+            if error is not None:
+                print("{} does not exist or is not a valid Wave file".format(infile), file=sys.stderr)
+            else:
+                updated += 1
+        print("{} file(s) added to or updated in the catalogue".format(updated), file=sys.stderr)
+    if args.prune:
+        print("{} file(s) removed from the catalogue".format(catalogue.prune()), file=sys.stderr)
+    if (args.update or args.prune) and not (args.condition or args.where or args.count):
+        catalogue.close()
+        return
+
+    where = [sql for sql, _ in conditions] + (["(" + args.where + ")"] if args.where else [])
+    parameters = tuple(value for _, value in conditions)
+    try:
+        rows = list(catalogue.query(" AND ".join(where), parameters, args.fields))
+        if args.count:
+            print(len(rows))
+        else:
+            output = csv.DictWriter(sys.stdout, args.fields)
+            output.writeheader()
+            output.writerows(rows)
+    except sqlite3.Error as e:
+        sys.exit("invalid query ({})".format(e))
+    finally:
+        catalogue.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import sys
+from autoBWF import BWFchunks, BWFdigest
+from autoBWF.batch import add_jobs_argument
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Create or verify block-wise tree digests of the audio data of BWF files')
+    parser.add_argument('--leaf-size', type=int, default=BWFdigest.tree_leaf_size >> 20, metavar="MB",
+                        help="size of the block covered by each leaf digest when creating (default: %(default)s)")
+    parser.add_argument('command', choices=["create", "verify"],
+                        help="create (or replace) the tree digest sidecar files, or verify the files against them")
+    add_jobs_argument(parser)
+    parser.add_argument('infile', nargs="+", help="BWF file")
+    args = parser.parse_args()
+
+    failures = 0
+    for infile in args.infile:
+        try:
+            if args.command == "create":
+                BWFdigest.write_tree(infile, BWFdigest.tree_digest(infile, args.leaf_size << 20, args.jobs))
+                continue
+            damaged = BWFdigest.verify_tree(infile, jobs=args.jobs)
+        except (OSError, ValueError, BWFchunks.NotWaveError) as e:
+            print("{}: {}".format(infile, e), file=sys.stderr)
+            failures += 1
+            continue
+
+        if damaged:
+            failures += 1
+            ranges = ", ".join("{}-{}".format(start, end) for start, end in damaged)
+            print("{}: damaged data bytes {}".format(infile, ranges))
+        else:
+            print("{}: ok".format(infile))
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
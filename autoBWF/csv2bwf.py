@@ -0,0 +1,108 @@
+import argparse
+import csv
+import sys
+import xml.etree.ElementTree
+from autoBWF.BWFfileIO import *
+from autoBWF.autobwfconfig import load_config
+from autoBWF.batch import add_jobs_argument, imap
+
+# bwf2csv columns that can be written back to the BWF core (bext and LIST/INFO) metadata. The Description is
+# reassembled from the FileContent, FileUse and OriginalFilename columns.
+core_fields = ["INAM", "ICRD", "ISRC", "ICOP", "ICMT", "OriginationDate", "OriginationTime"]
+
+xmp_fields = ["xmp_description", "owner", "language", "interviewer", "interviewee", "form", "host", "speaker",
+              "performer", "topics", "names", "events", "places", "creator"]
+
+
+def desired_core(row, core, ignore_empty=False):
+    """Return the BWF core values requested by a CSV row that differ from those already in the file."""
+    changed = {}
+    for field in core_fields:
+        if field in row and (row[field] != "" or not ignore_empty) and row[field] != core[field]:
+            changed[field] = row[field]
+
+    parts = [row.get("FileContent", ""), row.get("FileUse", ""), row.get("OriginalFilename", "")]
+    if all(parts):
+        description = "File content: {}; File use: {}; Original filename: {}".format(*parts)
+        if description != core["Description"]:
+            changed["Description"] = description
+    return changed
+
+
+def desired_xmp(row, xmp, ignore_empty=False):
+    """Return the complete XMP requested by a CSV row, or None if it matches the XMP already in the file."""
+    xmp = {k: xmp[k] or "" for k in xmp_fields}
+    new_xmp = dict(xmp)
+    for field in xmp_fields:
+        if field in row and (row[field] != "" or not ignore_empty):
+            new_xmp[field] = row[field]
+    if all(new_xmp[k] == xmp[k] for k in xmp_fields):
+        return None
+    return new_xmp
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Write metadata from a CSV file (in the format produced by bwf2csv) into BWF files')
+    parser.add_argument('--ignore-empty', action="store_true",
+                        help="leave fields unchanged if the corresponding CSV cell is empty")
+    parser.add_argument('--dry-run', action="store_true", help="report what would change without writing")
+    add_jobs_argument(parser)
+    parser.add_argument('infile', help="CSV file", type=argparse.FileType('r'))
+    args = parser.parse_args()
+
+    backend = default_backend()._replace(accept_nopadding=bool(load_config()["accept-nopadding"]))
+
+    core_changes = {}
+    xmp_changes = {}
+    for row in csv.DictReader(args.infile):
+        infile = row["filename"]
+        try:
+            core = get_bwf_core(infile, backend=backend)
+            xmp = get_xmp(infile, backend=backend)
+        except (OSError, BWFchunks.NotWaveError):
+            print("{} does not exist or is not a valid Wave file".format(infile), file=sys.stderr)
+            continue
+        except xml.etree.ElementTree.ParseError as e:
+            print("{}: could not parse XMP ({})".format(infile, e), file=sys.stderr)
+            continue
+
+        changed = desired_core(row, core, args.ignore_empty)
+        new_xmp = desired_xmp(row, xmp, args.ignore_empty)
+        if changed:
+            core_changes[infile] = changed
+        if new_xmp is not None:
+            xmp_changes[infile] = new_xmp
+        if not changed and new_xmp is None:
+            print("{}: unchanged".format(infile), file=sys.stderr)
+        else:
+            fields = list(changed) + [k for k in xmp_fields if new_xmp is not None and new_xmp[k] != (xmp[k] or "")]
+            print("{}: {}".format(infile, ", ".join(fields)), file=sys.stderr)
+
+    if args.dry_run:
+        return
+
+    # bwfmetaedit --in-core writes every column of its CSV, so give each file the full set of changed fields
+    all_fields = {field for changed in core_changes.values() for field in changed}
+    for infile, changed in core_changes.items():
+        if len(changed) < len(all_fields):
+            core = get_bwf_core(infile, backend=backend)
+            core_changes[infile] = {k: changed.get(k, core[k]) for k in all_fields}
+
+    failed = set()
+    if core_changes:
+        for infile, error in set_bwf_core_many(core_changes, backend=backend).items():
+            print("{}: could not write core metadata ({})".format(infile, error), file=sys.stderr)
+            failed.add(infile)
+
+    for (infile, _), _, error in imap(lambda item: set_xmp(item[1], item[0], backend=backend), xmp_changes.items(),
+                                      args.jobs):
+        if error is not None:
+            print("{}: could not write XMP ({})".format(infile, error), file=sys.stderr)
+            failed.add(infile)
+    if failed:
+        sys.exit("{} file(s) could not be updated".format(len(failed)))
+
+
+if __name__ == '__main__':
+    main()
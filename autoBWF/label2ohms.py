@@ -7,6 +7,7 @@ from appdirs import AppDirs
 from pathlib import Path
 import xml.etree.ElementTree as ET
 from os import path
+from autoBWF.batch import add_jobs_argument, imap
 
 namespaces = {"xml": "http://www.w3.org/XML/1998/namespace",
               "ohms": "https://www.weareavp.com/nunncenter/ohms"}
@@ -68,14 +69,19 @@ def create_ohms(labelfile, title):
 def main():
     parser = argparse.ArgumentParser(
         description='Convert labels exported from Audacity into index points in a minimal OHMS XML file')
+    add_jobs_argument(parser)
     parser.add_argument('infile', nargs="+", help="WAV file(s)")
     args = parser.parse_args()
 
-    for infile in args.infile:
+    def convert(infile):
         content_name = infile.replace('_labels.txt', '')
         outfile = content_name + '_ohms.xml'
         ET.ElementTree(create_ohms(infile, content_name)).write(outfile, xml_declaration=True, encoding='utf-8')
 
+    for infile, _, error in imap(convert, args.infile, args.jobs):
+        if error is not None:
+            print("{}: {}".format(infile, error), file=sys.stderr)
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,153 @@
+"""Output sinks for rows of extracted metadata.
+
+Each sink has the writerow() method of csv.DictWriter (the rows being dicts indexed by the names in fieldnames) and
+a close() method that must be called once all rows have been written. The sinks are selected by open_sink().
+"""
+
+import json
+import sqlite3
+import sys
+
+formats = ["csv", "jsonl", "sqlite", "parquet"]
+
+_extensions = {".jsonl": "jsonl", ".ndjson": "jsonl", ".sqlite": "sqlite", ".sqlite3": "sqlite", ".db": "sqlite",
+               ".parquet": "parquet"}
+
+
+def guess_format(outfile):
+    """Return the output format implied by the extension of outfile (by default, and for stdout, "csv")."""
+    import os
+
+    if outfile is None:
+        return "csv"
+    return _extensions.get(os.path.splitext(outfile)[1].lower(), "csv")
+
+
+class JsonLinesSink:
+    """Writes each row as a JSON object on a line of its own, appending to outfile (or writing to stdout)."""
+
+    def __init__(self, outfile, fieldnames):
+        self.fieldnames = fieldnames
+        self.file = open(outfile, "a", encoding="utf-8") if outfile is not None else sys.stdout
+
+    def writerow(self, row):
+        self.file.write(json.dumps({k: row[k] for k in self.fieldnames}, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class SQLiteSink:
+    """Inserts the rows into a table of an SQLite database, replacing any earlier row for the same filename.
+
+    The filename, OriginalFilename and FileUse columns are indexed. Rows are inserted in batches, one transaction
+    per batch. Columns that are missing from an existing table are added to it.
+
+    Args:
+        outfile (str): The database file.
+        fieldnames (list): The columns, which must include "filename".
+        table (str): The table name.
+        batch (int): Number of rows per transaction.
+
+    Raises:
+        ValueError: If fieldnames does not include "filename".
+    """
+
+    def __init__(self, outfile, fieldnames, table="bwf", batch=500):
+        if "filename" not in fieldnames:
+            raise ValueError("SQLite output requires the filename field, which identifies the rows")
+        self.fieldnames = fieldnames
+        self.table = table
+        self.batch = batch
+        self.rows = []
+        self.db = sqlite3.connect(outfile)
+
+        columns = ", ".join('"{}" TEXT{}'.format(k, " PRIMARY KEY" if k == "filename" else "") for k in fieldnames)
+        self.db.execute('CREATE TABLE IF NOT EXISTS "{}" ({})'.format(table, columns))
+        existing = [row[1] for row in self.db.execute('PRAGMA table_info("{}")'.format(table))]
+        for k in fieldnames:
+            if k not in existing:
+                self.db.execute('ALTER TABLE "{}" ADD COLUMN "{}" TEXT'.format(table, k))
+        for k in ["OriginalFilename", "FileUse"]:
+            if k in fieldnames:
+                self.db.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ("{1}")'.format(table, k))
+        self.db.commit()
+
+        self.insert = 'INSERT OR REPLACE INTO "{}" ({}) VALUES ({})'.format(
+            table, ", ".join('"{}"'.format(k) for k in fieldnames), ", ".join("?" for _ in fieldnames))
+
+    def writerow(self, row):
+        self.rows.append(tuple(row[k] for k in self.fieldnames))
+        if len(self.rows) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        with self.db:
+            self.db.executemany(self.insert, self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+class ParquetSink:
+    """Writes the rows to a Parquet file (replacing any existing file), one row group per batch rows.
+
+    All columns are written as strings. This requires pyarrow.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+
+    def __init__(self, outfile, fieldnames, batch=10000):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.fieldnames = fieldnames
+        self.batch = batch
+        self.rows = []
+        self.schema = pyarrow.schema([(k, pyarrow.string()) for k in fieldnames])
+        self.writer = pyarrow.parquet.ParquetWriter(outfile, self.schema)
+
+    def writerow(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            columns = {k: [row[k] for row in self.rows] for k in self.fieldnames}
+            self.writer.write_table(self.pyarrow.Table.from_pydict(columns, schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def open_sink(output_format, outfile, fieldnames):
+    """Return a sink writing the given fields to outfile in output_format ("jsonl", "sqlite" or "parquet").
+
+    JSON Lines and SQLite output are added to an existing outfile, while Parquet output replaces it. Only JSON
+    Lines can be written to stdout (if outfile is None).
+
+    Raises:
+        ValueError: If output_format is unknown, requires an outfile, or (for SQLite) fieldnames lacks "filename".
+        ImportError: If the format requires a package that is not installed.
+    """
+
+    if output_format == "jsonl":
+        return JsonLinesSink(outfile, fieldnames)
+    if outfile is None:
+        raise ValueError("{} output requires an output file".format(output_format))
+    if output_format == "sqlite":
+        return SQLiteSink(outfile, fieldnames)
+    if output_format == "parquet":
+        return ParquetSink(outfile, fieldnames)
+    raise ValueError("unknown output format {}".format(output_format))
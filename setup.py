@@ -28,11 +28,18 @@ setup(
             'autosplice=autoBWF.autosplice:main',
             'bwf2pbcore=autoBWF.bwf2pbcore:main',
             'bwf2csv=autoBWF.bwf2csv:main',
+            'csv2bwf=autoBWF.csv2bwf:main',
+            'bwffixity=autoBWF.bwffixity:main',
+            'bwftree=autoBWF.bwftree:main',
+            'bwf2bag=autoBWF.bwf2bag:main',
+            'bwfdedupe=autoBWF.bwfdedupe:main',
+            'bwfquery=autoBWF.bwfquery:main',
             'label2ohms=autoBWF.label2ohms:main',
             'bwf2grist=autoBWF.bwf2grist:cli'
         ],
     },
     install_requires=requirements,
+    extras_require={'parquet': ['pyarrow']},
     license="GNU General Public License v3",
     long_description=readme + '\n\n' + history,
     long_description_content_type="text/markdown",
@@ -0,0 +1,82 @@
+import hashlib
+import struct
+
+import pytest
+
+
+def chunk(ckid, data, pad=True):
+    """Return a RIFF chunk (header, data and, unless pad is False, the pad byte of an odd-sized chunk)."""
+    block = ckid + struct.pack("<I", len(data)) + data
+    if pad and len(data) % 2:
+        block += b"\x00"
+    return block
+
+
+def bext_data(description="File content: X1; File use: Preservation Master; Original filename: a.wav",
+              history="A=PCM,F=48000\r\n"):
+    data = description.encode("ascii").ljust(256, b"\x00") + b"Originator".ljust(32, b"\x00")
+    data += b"Reference".ljust(32, b"\x00") + b"2019-01-02" + b"10:11:12"
+    data += struct.pack("<QH", 48000 * 3661, 1) + b"\x00" * (64 + 10 + 180) + history.encode("ascii")
+    return data
+
+
+def info_data(fields):
+    data = b"INFO"
+    for key, value in fields.items():
+        data += chunk(key.encode("ascii"), value.encode("utf-8") + b"\x00")
+    return data
+
+
+XMP = (b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+       b'<rdf:Description xmlns:autoBWF="http://ns.ukrhec.org/autoBWF/0.1">'
+       b'<autoBWF:Interviewer>Bob</autoBWF:Interviewer></rdf:Description></rdf:RDF></x:xmpmeta>')
+
+
+def audio(size=48000 * 6):
+    return bytes((i * 7) % 251 for i in range(size))
+
+
+def make_wave(path, pad=True, junk=0, xmp=XMP, info=None, md5=True, data=None):
+    """Write a small 16-bit stereo BWF file and return the data chunk contents.
+
+    With pad=False, the odd-sized chunks (bext, "odd " and possibly LIST) are not followed by pad bytes.
+    """
+    data = audio() if data is None else data
+    fmt = struct.pack("<HHIIHH", 1, 2, 48000, 48000 * 4, 4, 16)
+    body = b"WAVE" + chunk(b"fmt ", fmt) + chunk(b"bext", bext_data(), pad=pad)
+    if junk:
+        body += chunk(b"JUNK", b"\x00" * junk)
+    body += chunk(b"LIST", info_data(info or {"INAM": "Title", "ICRD": "1970", "ISRC": "Coll"}), pad=pad)
+    body += chunk(b"odd ", b"abc", pad=pad)
+    if xmp is not None:
+        body += chunk(b"_PMX", xmp)
+    body += chunk(b"data", data)
+    if md5:
+        body += chunk(b"MD5 ", hashlib.md5(data).digest())
+    with open(path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", len(body)) + body)
+    return data
+
+
+def make_rf64(path, form=b"RF64"):
+    """Write a small RF64 (or BW64) file whose data and bext sizes are only given in the ds64 chunk."""
+    data = audio(48000 * 6)
+    fmt = struct.pack("<HHIIHH", 1, 2, 48000, 48000 * 4, 4, 16)
+    bext = bext_data()
+    ds64 = struct.pack("<QQQI", 0, len(data), len(data) // 4, 1) + b"bext" + struct.pack("<Q", len(bext))
+    body = b"WAVE" + chunk(b"ds64", ds64) + chunk(b"fmt ", fmt)
+    body += b"bext" + struct.pack("<I", 0xffffffff) + bext + b"\x00" * (len(bext) % 2)
+    body += b"data" + struct.pack("<I", 0xffffffff) + data
+    body += chunk(b"MD5 ", hashlib.md5(data).digest())
+    with open(path, "wb") as f:
+        f.write(form + struct.pack("<I", 0xffffffff) + body)
+    return data
+
+
+@pytest.fixture(autouse=True)
+def user_dirs(tmp_path, monkeypatch):
+    """Keep the journal, cache and configuration of the tests out of the real user directories."""
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "home" / "data"))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "home" / "cache"))
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "home" / "config"))
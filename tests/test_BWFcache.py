@@ -0,0 +1,47 @@
+from autoBWF.BWFcache import MetadataCache
+
+
+def test_entries_follow_the_file(tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.sqlite"))
+    file = tmp_path / "a.wav"
+    file.write_bytes(b"one")
+    assert cache.get(str(file)) is None
+    cache.put(str(file), {"core": {"INAM": "A"}})
+    assert cache.get(str(file)) == {"core": {"INAM": "A"}}
+
+    file.write_bytes(b"three")
+    assert cache.get(str(file)) is None
+    assert cache.get(str(tmp_path / "missing.wav")) is None
+    cache.close()
+
+
+def test_digests(tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.sqlite"))
+    file = str(tmp_path / "a.wav")
+    with open(file, "wb") as f:
+        f.write(b"data")
+    cache.put(file, {"x": 1})
+    cache.put_digest(file, "data.md5", "abc")
+    assert cache.get_digest(file, "data.md5") == "abc"
+    assert cache.get_digest(file, "file.md5") is None
+
+    cache.clear()
+    assert cache.get(file) is None
+    assert cache.get_digest(file, "data.md5") == "abc"
+    cache.invalidate(file)
+    assert cache.get_digest(file, "data.md5") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = MetadataCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    files = []
+    for name in "abc":
+        files.append(str(tmp_path / name))
+        with open(files[-1], "w") as f:
+            f.write(name)
+    cache.put(files[0], 0)
+    cache.put(files[1], 1)
+    assert cache.get(files[0]) == 0
+    cache._inserts = 100
+    cache.put(files[2], 2)
+    assert [cache.get(file) for file in files] == [0, None, 2]
@@ -0,0 +1,385 @@
+import hashlib
+import os
+import struct
+
+import pytest
+
+from autoBWF import BWFchunks
+from conftest import XMP, audio, bext_data, chunk, make_wave, make_rf64
+
+
+def data_md5(filename):
+    with BWFchunks.WaveFile(filename) as wave:
+        assert wave.errors == []
+        digest = hashlib.md5()
+        for block in wave.iter_data():
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def test_read_metadata(tmp_path):
+    wav = str(tmp_path / "a.wav")
+    data = make_wave(wav)
+    md = BWFchunks.read_metadata(wav)
+    assert md["errors"] == []
+    assert md["core"]["INAM"] == "Title"
+    assert md["core"]["ICRD"] == "1970"
+    assert md["core"]["OriginationDate"] == "2019-01-02"
+    assert md["core"]["CodingHistory"] == "A=PCM,F=48000\r\n"
+    assert md["MD5Stored"] == hashlib.md5(data).hexdigest()
+    assert md["xmp"].startswith(b"<x:xmpmeta")
+
+
+@pytest.mark.parametrize("form", [b"RF64", b"BW64"])
+def test_rf64_sizes_from_ds64(tmp_path, form):
+    wav = str(tmp_path / "r.wav")
+    data = make_rf64(wav, form)
+    with BWFchunks.WaveFile(wav) as wave:
+        assert wave.form == form.decode("ascii")
+        assert wave.errors == []
+        assert wave.find("data").size == len(data)
+        assert wave.find("bext").size == len(wave.read(wave.find("bext")))
+    assert data_md5(wav) == hashlib.md5(data).hexdigest()
+    assert BWFchunks.read_metadata(wav)["core"]["Originator"] == "Originator"
+
+
+def test_not_wave(tmp_path):
+    bad = tmp_path / "bad.wav"
+    bad.write_bytes(b"hello world")
+    with pytest.raises(BWFchunks.NotWaveError):
+        BWFchunks.WaveFile(str(bad))
+
+
+@pytest.mark.parametrize("pad", [True, False])
+@pytest.mark.parametrize("md", [{"INAM": "Short"}, {"CodingHistory": ""}, {"INAM": "", "ICRD": ""},
+                                {"Description": "New description", "ICMT": "A comment"}])
+def test_write_round_trip(tmp_path, pad, md):
+    wav = str(tmp_path / "a.wav")
+    # the long title makes the LIST size byte unprintable, so that the unpadded layout is detected unambiguously
+    data = make_wave(wav, pad=pad, info={"INAM": "T" * 120, "ICRD": "1970"})
+    BWFchunks.write_metadata(wav, md, accept_nopadding=True)
+
+    assert data_md5(wav) == hashlib.md5(data).hexdigest()
+    core = BWFchunks.read_metadata(wav)["core"]
+    for k, v in md.items():
+        assert core[k] == v
+    assert core["OriginationDate"] == "2019-01-02"
+
+
+def test_write_in_place_odd_slot(tmp_path):
+    # the bext chunk of an unpadded file has an odd size, so shrinking it leaves an odd-sized slot to be filled
+    wav = str(tmp_path / "u.wav")
+    data = make_wave(wav, pad=False, info={"INAM": "T" * 120})
+    assert BWFchunks.write_metadata(wav, {"CodingHistory": ""}, accept_nopadding=True)
+
+    with BWFchunks.WaveFile(wav) as wave:
+        assert wave.errors == []
+        assert [chunk.id for chunk in wave.chunks] == ["fmt ", "bext", "JUNK", "LIST", "odd ", "_PMX", "data", "MD5 "]
+    assert data_md5(wav) == hashlib.md5(data).hexdigest()
+
+
+def test_write_grows_into_junk(tmp_path):
+    wav = str(tmp_path / "j.wav")
+    data = make_wave(wav, junk=200)
+    assert BWFchunks.write_metadata(wav, {"CodingHistory": "A=PCM,F=48000,W=16,M=stereo\r\n" * 4})
+    assert BWFchunks.read_metadata(wav)["core"]["CodingHistory"].count("M=stereo") == 4
+    assert data_md5(wav) == hashlib.md5(data).hexdigest()
+
+
+def test_write_rewrites_when_too_large(tmp_path):
+    wav = str(tmp_path / "a.wav")
+    data = make_wave(wav)
+    assert not BWFchunks.write_metadata(wav, {"CodingHistory": "A=PCM\r\n" * 100})
+    assert BWFchunks.read_metadata(wav)["core"]["CodingHistory"] == "A=PCM\r\n" * 100
+    assert data_md5(wav) == hashlib.md5(data).hexdigest()
+
+
+def test_write_md5_and_xmp(tmp_path):
+    wav = str(tmp_path / "a.wav")
+    data = make_wave(wav, md5=False, xmp=None)
+    xmp = b"<x:xmpmeta xmlns:x=\"adobe:ns:meta/\"/>"
+    BWFchunks.write_metadata(wav, {}, xmp=xmp, md5_embed=True)
+    md = BWFchunks.read_metadata(wav)
+    assert md["MD5Stored"] == hashlib.md5(data).hexdigest()
+    assert md["xmp"] == xmp
+
+
+def test_write_rf64(tmp_path):
+    wav = str(tmp_path / "r.wav")
+    data = make_rf64(wav)
+    BWFchunks.write_metadata(wav, {"INAM": "RF64 title", "CodingHistory": "A=PCM\r\n" * 100})
+    with BWFchunks.WaveFile(wav) as wave:
+        assert wave.form == "RF64"
+    assert BWFchunks.read_metadata(wav)["core"]["INAM"] == "RF64 title"
+    assert data_md5(wav) == hashlib.md5(data).hexdigest()
+
+
+def write_riff(path, *chunks):
+    """Write a RIFF/WAVE file consisting of the given chunks."""
+    body = b"WAVE" + b"".join(chunks)
+    with open(path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", len(body)) + body)
+
+
+FMT = chunk(b"fmt ", struct.pack("<HHIIHH", 1, 2, 48000, 48000 * 4, 4, 16))
+
+
+def check_riff_size(filename):
+    with open(filename, "rb") as f:
+        assert struct.unpack("<4sI", f.read(8))[1] == os.path.getsize(filename) - 8
+
+
+def test_write_new_chunk_and_grow_last_chunk(tmp_path):
+    wav = str(tmp_path / "a.wav")
+    data = audio()
+    write_riff(wav, FMT, chunk(b"bext", bext_data()), chunk(b"data", data), chunk(b"_PMX", b"<x/>"))
+    assert BWFchunks.write_metadata(wav, {"INAM": "A title"}, xmp=XMP)
+
+    check_riff_size(wav)
+    md = BWFchunks.read_metadata(wav)
+    assert md["errors"] == []
+    assert md["core"]["INAM"] == "A title"
+    assert md["xmp"] == XMP
+    assert data_md5(wav) == hashlib.md5(data).hexdigest()
+
+
+def test_write_new_chunk_before_md5(tmp_path):
+    # the usual save of the GUI: add XMP to a file that ends with an MD5 chunk, and update that chunk
+    wav = str(tmp_path / "a.wav")
+    data = make_wave(wav, xmp=None)
+    assert BWFchunks.write_metadata(wav, {"INAM": "Tit"}, xmp=XMP, md5_embed=True)
+
+    check_riff_size(wav)
+    md = BWFchunks.read_metadata(wav)
+    assert md["errors"] == []
+    assert md["xmp"] == XMP
+    assert md["MD5Stored"] == hashlib.md5(data).hexdigest()
+    assert md["core"]["INAM"] == "Tit"
+
+
+def test_new_bext_is_not_placed_after_data(tmp_path):
+    wav = str(tmp_path / "a.wav")
+    data = audio()
+    write_riff(wav, FMT, chunk(b"data", data), chunk(b"JUNK", b"\x00" * 1000))
+    assert not BWFchunks.write_metadata(wav, {"Description": "x"})
+
+    with BWFchunks.WaveFile(wav) as wave:
+        assert [c.id for c in wave.chunks] == ["fmt ", "bext", "data", "JUNK"]
+    assert BWFchunks.read_metadata(wav)["core"]["Description"] == "x"
+    assert data_md5(wav) == hashlib.md5(data).hexdigest()
+
+
+def test_new_chunks_may_use_junk_after_data(tmp_path):
+    wav = str(tmp_path / "a.wav")
+    write_riff(wav, FMT, chunk(b"data", audio()), chunk(b"JUNK", b"\x00" * 1000))
+    assert BWFchunks.write_metadata(wav, {"INAM": "A title"})
+    check_riff_size(wav)
+    # the filler at the end of the file is not kept
+    with BWFchunks.WaveFile(wav) as wave:
+        assert [c.id for c in wave.chunks] == ["fmt ", "data", "LIST"]
+
+
+def test_refuses_unpadded_files(tmp_path):
+    wav = str(tmp_path / "u.wav")
+    make_wave(wav, pad=False, info={"INAM": "T" * 120})
+    with pytest.raises(BWFchunks.WriteError):
+        BWFchunks.write_metadata(wav, {"INAM": "Short"})
+
+
+def crash_before_sync(monkeypatch):
+    """Make the next in-place write stop just before the Wave file is synced, leaving its journal behind."""
+    fsync = os.fsync
+    calls = []
+
+    def crash(fd):
+        calls.append(fd)
+        # the journal and its directory are synced first
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", crash)
+
+
+def test_plan_in_place_uses_following_junk(tmp_path):
+    wav = str(tmp_path / "j.wav")
+    make_wave(wav, junk=100)
+    with BWFchunks.WaveFile(wav) as wave:
+        bext = wave.read(wave.find("bext"))
+        writes, new_size = BWFchunks._plan_in_place(wave, {("bext", None): bext + b"x" * 51})
+        assert new_size == wave.stat.st_size
+        assert len(writes) == 1
+        offset, block = writes[0]
+        assert offset == wave.find("bext").offset - 8
+        assert offset + len(block) == wave.find("LIST").offset - 8
+        assert BWFchunks._plan_in_place(wave, {("bext", None): bext + b"x" * 1000}) is None
+
+
+def test_interrupted_write_is_rolled_back_on_open(tmp_path, monkeypatch):
+    wav = str(tmp_path / "a.wav")
+    data = make_wave(wav, junk=100)
+    original = open(wav, "rb").read()
+
+    crash_before_sync(monkeypatch)
+    with pytest.raises(KeyboardInterrupt):
+        BWFchunks.write_metadata(wav, {"INAM": "Tit", "CodingHistory": "A=PCM\r\n" * 10})
+    assert open(wav, "rb").read() != original
+    assert os.path.exists(BWFchunks._journal_path(wav))
+
+    # merely reading the file rolls the write back
+    assert BWFchunks.read_metadata(wav)["core"]["INAM"] == "Title"
+    assert open(wav, "rb").read() == original
+    assert not os.path.exists(BWFchunks._journal_path(wav))
+    assert data_md5(wav) == hashlib.md5(data).hexdigest()
+
+
+def test_write_in_progress_is_not_rolled_back(tmp_path):
+    import fcntl
+    import json
+
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav)
+    current = open(wav, "rb").read()
+    journal = BWFchunks._journal_path(wav, create=True)
+    with open(journal, "w") as j:
+        fcntl.flock(j.fileno(), fcntl.LOCK_EX)
+        json.dump({"file": wav, "size": 12, "regions": []}, j)
+        j.flush()
+        assert not BWFchunks.recover(wav)
+        assert open(wav, "rb").read() == current
+    os.remove(journal)
+
+
+def test_unrecoverable_file_is_not_written(tmp_path, monkeypatch):
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav, junk=100)
+    crash_before_sync(monkeypatch)
+    with pytest.raises(KeyboardInterrupt):
+        BWFchunks.write_metadata(wav, {"INAM": "Tit"})
+
+    def read_only(filename):
+        raise PermissionError("read-only file")
+
+    monkeypatch.setattr(BWFchunks, "recover", read_only)
+    with BWFchunks.WaveFile(wav) as wave:
+        assert "could not be rolled back" in wave.errors[0]
+    with pytest.raises(BWFchunks.WriteError):
+        BWFchunks.write_metadata(wav, {"INAM": "Again"})
+
+
+def test_journal_appears_complete_and_locked(tmp_path, monkeypatch):
+    import json
+
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav, junk=100)
+    journal = BWFchunks._journal_path(wav)
+    link = os.link
+    seen = []
+
+    def linking(source, target):
+        # a reader that looks for a journal just before or after it is linked into place finds nothing to undo
+        seen.append(os.path.exists(target))
+        assert not BWFchunks.recover(wav)
+        link(source, target)
+        assert not BWFchunks.recover(wav)
+        with open(target) as f:
+            seen.append(len(json.load(f)["regions"]))
+
+    monkeypatch.setattr(os, "link", linking)
+    assert BWFchunks.write_metadata(wav, {"INAM": "Tit"})
+    assert seen == [False, 1]
+    assert not os.path.exists(journal)
+    assert os.listdir(os.path.dirname(journal)) == []
+    assert BWFchunks.read_metadata(wav)["core"]["INAM"] == "Tit"
+
+
+def test_journal_removed_by_someone_else(tmp_path, monkeypatch):
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav, junk=100)
+    fsync = os.fsync
+    calls = []
+
+    def removing(fd):
+        calls.append(fd)
+        if len(calls) == 3:
+            os.remove(BWFchunks._journal_path(wav))
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", removing)
+    assert BWFchunks.write_metadata(wav, {"INAM": "Tit"})
+    assert BWFchunks.read_metadata(wav)["core"]["INAM"] == "Tit"
+
+
+def test_concurrent_write_is_refused(tmp_path):
+    import fcntl
+
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav, junk=100)
+    journal = BWFchunks._journal_path(wav, create=True)
+    with open(journal, "w") as j:
+        fcntl.flock(j.fileno(), fcntl.LOCK_EX)
+        j.write('{"file": "", "size": 0, "regions": []}')
+        j.flush()
+        with pytest.raises(BWFchunks.WriteError):
+            BWFchunks.write_metadata(wav, {"INAM": "Tit"})
+    os.remove(journal)
+    assert BWFchunks.read_metadata(wav)["core"]["INAM"] == "Title"
+
+
+def extensible_fmt(channels, sample_rate, bits, subformat):
+    """Return a WAVE_FORMAT_EXTENSIBLE fmt chunk whose SubFormat GUID starts with the codec subformat."""
+    block_align = channels * bits // 8
+    guid = struct.pack("<H", subformat) + b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+    return struct.pack("<HHIIHHHHI", BWFchunks.WAVE_FORMAT_EXTENSIBLE, channels, sample_rate,
+                       sample_rate * block_align, block_align, bits, 22, bits, 0x3f) + guid
+
+
+@pytest.mark.parametrize("subformat", [0x0001, 0x0003])
+def test_decode_fmt_extensible(subformat):
+    fmt = BWFchunks.decode_fmt(extensible_fmt(6, 96000, 24, subformat))
+    assert fmt == {"FormatTag": subformat, "Channels": 6, "SampleRate": 96000, "ByteRate": 96000 * 18,
+                   "BlockAlign": 18, "BitPerSample": 24}
+
+
+def test_decode_fmt_short_chunks():
+    # a WAVEFORMAT without wBitsPerSample, and an extensible tag without the extension
+    assert BWFchunks.decode_fmt(struct.pack("<HHIIH", 1, 1, 8000, 8000, 1))["BitPerSample"] == 0
+    fmt = BWFchunks.decode_fmt(struct.pack("<HHIIHH", BWFchunks.WAVE_FORMAT_EXTENSIBLE, 2, 44100, 176400, 4, 16))
+    assert fmt["FormatTag"] == BWFchunks.WAVE_FORMAT_EXTENSIBLE
+    with pytest.raises(BWFchunks.NotWaveError):
+        BWFchunks.decode_fmt(b"\x01\x00\x02\x00")
+
+
+def test_tech_of_extensible_file(tmp_path):
+    wav = str(tmp_path / "x.wav")
+    data = b"\x00" * (96000 * 18 * 2 + 18 * 48)
+    bext = bext_data()[:338] + struct.pack("<Q", 96000 * 90) + bext_data()[346:]
+    write_riff(wav, chunk(b"fmt ", extensible_fmt(6, 96000, 24, 0x0003)), chunk(b"bext", bext),
+               chunk(b"iXML", b"<BWFXML/>"), chunk(b"data", data))
+    md = BWFchunks.read_metadata(wav)
+    tech = md["tech"]
+    assert tech["Format"] == "Wave"
+    assert tech["CodecID"] == "0003"
+    assert tech["Channels"] == "6"
+    assert tech["SampleRate"] == "96000"
+    assert tech["BitRate"] == str(96000 * 18 * 8)
+    assert tech["BitPerSample"] == "24"
+    assert tech["Duration"] == "00:00:02.000"
+    assert tech["FileSize"] == str(os.path.getsize(wav))
+    assert (tech["bext"], tech["INFO"], tech["XMP"], tech["iXML"]) == ("Yes", "", "", "Yes")
+    assert tech["UnsupportedChunks"] == ""
+    assert tech["Errors"] == ""
+    assert md["core"]["TimeReference (translated)"] == "00:01:30.000"
+
+
+def test_tech_of_pcm_files(tmp_path):
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav)
+    tech = BWFchunks.read_metadata(wav)["tech"]
+    assert (tech["CodecID"], tech["Channels"], tech["BitRate"], tech["Duration"]) == ("0001", "2", "1536000",
+                                                                                      "00:00:01.500")
+    assert (tech["INFO"], tech["XMP"], tech["UnsupportedChunks"]) == ("Yes", "Yes", "odd ")
+
+    rf64 = str(tmp_path / "r.wav")
+    make_rf64(rf64)
+    assert BWFchunks.read_metadata(rf64)["tech"]["Format"] == "Wave (RF64)"
@@ -0,0 +1,83 @@
+import hashlib
+import os
+
+import pytest
+
+from autoBWF import BWFdigest
+from autoBWF.BWFcache import MetadataCache
+from conftest import make_wave
+
+
+def supports_xattrs(path):
+    try:
+        os.setxattr(path, "user.autobwf.test", b"1")
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+def test_file_digests(tmp_path):
+    wav = str(tmp_path / "a.wav")
+    data = make_wave(wav)
+    with open(wav, "rb") as f:
+        contents = f.read()
+    digests = BWFdigest.file_digests(wav, ["md5", "sha256"], ["sha1"])
+    assert digests["data"] == {"md5": hashlib.md5(data).hexdigest(), "sha256": hashlib.sha256(data).hexdigest()}
+    assert digests["file"] == {"sha1": hashlib.sha1(contents).hexdigest()}
+    assert BWFdigest.data_md5(wav) == hashlib.md5(data).hexdigest()
+
+
+@pytest.mark.parametrize("xattrs", [True, False])
+def test_cached_digests_are_stored_and_reused(tmp_path, monkeypatch, xattrs):
+    wav = str(tmp_path / "a.wav")
+    data = make_wave(wav)
+    if xattrs and not supports_xattrs(wav):
+        pytest.skip("the filesystem does not support extended attributes")
+    if not xattrs:
+        def unsupported(*args):
+            raise OSError("not supported")
+        monkeypatch.setattr(os, "setxattr", unsupported)
+    cache = MetadataCache(str(tmp_path / "cache.sqlite"))
+
+    md5 = hashlib.md5(data).hexdigest()
+    assert BWFdigest.cached_digests(wav, cache=cache)["data"]["md5"] == md5
+    if xattrs:
+        assert os.getxattr(wav, "user.autobwf.data.md5").split()[0] == md5.encode("ascii")
+    else:
+        assert cache.get_digest(wav, "data.md5") == md5
+
+    computed = []
+    file_digests = BWFdigest.file_digests
+
+    def counting(filename, data_algorithms, file_algorithms):
+        computed.append((list(data_algorithms), list(file_algorithms)))
+        return file_digests(filename, data_algorithms, file_algorithms)
+
+    monkeypatch.setattr(BWFdigest, "file_digests", counting)
+    assert BWFdigest.cached_digests(wav, ["md5", "sha1"], cache=cache)["data"]["md5"] == md5
+    assert BWFdigest.cached_digests(wav, ["md5", "sha1"], cache=cache, rehash=True)["data"]["md5"] == md5
+    assert computed == [(["sha1"], []), (["md5", "sha1"], [])]
+
+
+def test_stored_digests_of_changed_files_are_ignored(tmp_path):
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav)
+    if not supports_xattrs(wav):
+        pytest.skip("the filesystem does not support extended attributes")
+    BWFdigest.cached_digests(wav)
+    st = os.stat(wav)
+    with open(wav, "r+b") as f:
+        f.seek(-100, 2)
+        f.write(b"\xff")
+    # make sure the change is visible even with a coarse timestamp granularity
+    os.utime(wav, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert BWFdigest.cached_digests(wav)["data"]["md5"] == BWFdigest.data_md5(wav)
+
+
+def test_fingerprint_and_sampled_data_digest(tmp_path):
+    a, b = str(tmp_path / "a.wav"), str(tmp_path / "b.wav")
+    make_wave(a)
+    make_wave(b, info={"INAM": "Other", "ICRD": "1970", "ISRC": "Coll"})
+    assert BWFdigest.fingerprint(a) == BWFdigest.fingerprint(a)
+    assert BWFdigest.fingerprint(a) != BWFdigest.fingerprint(b)
+    assert BWFdigest.sampled_data_digest(a) == BWFdigest.sampled_data_digest(b)
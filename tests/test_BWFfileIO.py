@@ -0,0 +1,84 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from autoBWF import BWFfileIO
+from autoBWF.BWFcache import MetadataCache
+from autoBWF.BWFfileIO import Backend
+from conftest import make_wave
+
+
+@pytest.fixture(params=["uncached", "cached"])
+def backend(request, tmp_path):
+    if request.param == "cached":
+        return Backend(cache=MetadataCache(str(tmp_path / "cache.sqlite")))
+    return Backend()
+
+
+def test_get_xmp(tmp_path, backend):
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav)
+    assert BWFfileIO.get_xmp(wav, backend=backend)["interviewer"] == "Bob"
+    assert BWFfileIO.get_xmp(wav, backend=backend)["interviewer"] == "Bob"
+
+    make_wave(wav, xmp=None)
+    assert BWFfileIO.get_xmp(wav, backend=backend)["interviewer"] == ""
+
+
+def test_malformed_xmp_only_breaks_get_xmp(tmp_path, backend):
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav, xmp=b"<x:xmpmeta><broken")
+    for _ in range(2):
+        assert BWFfileIO.get_bwf_core(wav, backend=backend)["INAM"] == "Title"
+        assert BWFfileIO.get_bwf_tech(wav, backend=backend)["MD5Stored"]
+        assert BWFfileIO.check_wave(wav, backend=backend) is not None
+        with pytest.raises(ET.ParseError):
+            BWFfileIO.get_xmp(wav, backend=backend)
+
+
+def test_check_wave_rejects_unparsable_files(tmp_path, backend, monkeypatch):
+    bad = tmp_path / "bad.wav"
+    bad.write_bytes(b"hello world")
+    assert BWFfileIO.check_wave(str(bad), backend=backend) is None
+
+    def malformed(*args, **kwargs):
+        raise ET.ParseError("not well-formed")
+
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav)
+    monkeypatch.setattr(BWFfileIO, "get_bwf_tech", malformed)
+    assert BWFfileIO.check_wave(wav, backend=backend) is None
+
+
+def test_load_bwf_many_async(tmp_path, backend):
+    import asyncio
+
+    good, broken, missing = (str(tmp_path / name) for name in ["good.wav", "broken.wav", "missing.wav"])
+    make_wave(good)
+    make_wave(broken, xmp=b"<x:xmpmeta><broken")
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(BWFfileIO.load_bwf_many_async([good, broken, missing], backend=backend))
+        md = loop.run_until_complete(BWFfileIO.load_bwf_async(good, verify_digest=True, backend=backend))
+        assert loop.run_until_complete(BWFfileIO.check_wave_async(missing, backend=backend)) is None
+    finally:
+        loop.close()
+
+    assert results[broken] is None
+    assert results[missing] is None
+    assert results[good]["INAM"] == "Title"
+    assert results[good]["interviewer"] == "Bob"
+    assert results[good]["Errors"] == ""
+    assert md["MD5Generated"] == md["MD5Stored"]
+
+
+def test_write_backend_is_chosen_by_the_backend(tmp_path):
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav, junk=100)
+    # "true" stands in for a bwfmetaedit that accepts the command without changing the file
+    BWFfileIO.set_bwf_metadata({"INAM": "Tit"}, wav, backend=Backend(native=False, executable="true"))
+    assert BWFfileIO.get_bwf_core(wav)["INAM"] == "Title"
+    xmp = dict(BWFfileIO.get_xmp(wav), interviewer="Alice")
+    BWFfileIO.set_bwf_metadata({"INAM": "Tit"}, wav, xmp=xmp, backend=Backend())
+    assert BWFfileIO.get_bwf_core(wav)["INAM"] == "Tit"
+    assert BWFfileIO.get_xmp(wav)["interviewer"] == "Alice"
@@ -0,0 +1,29 @@
+import hashlib
+import os
+import sys
+
+from autoBWF import bwf2bag
+from conftest import make_wave
+
+
+def test_bag(tmp_path, monkeypatch):
+    top = tmp_path / "archive"
+    os.makedirs(str(top / "sub"))
+    files = [str(top / "a.wav"), str(top / "sub" / "b.wav")]
+    for file in files:
+        make_wave(file)
+    bag = str(tmp_path / "bag")
+    monkeypatch.setattr(sys, "argv", ["bwf2bag", "-a", "sha256", "--info", "ISRC", "-r", str(top), bag])
+    bwf2bag.main()
+
+    for file, name in zip(files, ["data/a.wav", "data/sub/b.wav"]):
+        assert os.path.samefile(file, os.path.join(bag, *name.split("/")))
+    with open(os.path.join(bag, "manifest-sha256.txt")) as f:
+        manifest = f.read().splitlines()
+    with open(files[0], "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    assert manifest[0] == "{}  data/a.wav".format(digest)
+    assert len(manifest) == 2
+    with open(os.path.join(bag, "bag-info.txt")) as f:
+        assert "ISRC: Coll\n" in f.read()
+    assert os.path.exists(os.path.join(bag, "tagmanifest-sha256.txt"))
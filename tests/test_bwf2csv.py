@@ -0,0 +1,163 @@
+import csv
+import gc
+import os
+import sys
+
+import pytest
+
+from autoBWF import bwf2csv
+from conftest import make_wave
+
+
+def write_csv(filename, fieldnames, rows):
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def read_csv(filename):
+    with open(filename, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_upsert_replaces_rows_by_key(tmp_path):
+    out = str(tmp_path / "out.csv")
+    write_csv(out, ["filename", "INAM"], [{"filename": "a", "INAM": "A"}, {"filename": "b", "INAM": "B"},
+                                          {"filename": "a", "INAM": "A again"}])
+    writer = bwf2csv.UpsertWriter(out, ["filename", "INAM", "ICRD"], "filename")
+    writer.writerow({"filename": "b", "INAM": "B2", "ICRD": "2000"})
+    writer.writerow({"filename": "c", "INAM": "C", "ICRD": "2001"})
+    writer.close()
+    assert read_csv(out) == [{"filename": "b", "INAM": "B2", "ICRD": "2000"},
+                             {"filename": "a", "INAM": "A again", "ICRD": ""},
+                             {"filename": "c", "INAM": "C", "ICRD": "2001"}]
+
+
+def test_upsert_keeps_rows_with_empty_keys(tmp_path):
+    out = str(tmp_path / "out.csv")
+    fields = ["filename", "OriginalFilename"]
+    write_csv(out, fields, [{"filename": "a", "OriginalFilename": ""}, {"filename": "b", "OriginalFilename": ""},
+                            {"filename": "c", "OriginalFilename": "c.wav"}])
+    writer = bwf2csv.UpsertWriter(out, fields, "OriginalFilename")
+    writer.writerow({"filename": "d", "OriginalFilename": ""})
+    writer.writerow({"filename": "e", "OriginalFilename": ""})
+    writer.writerow({"filename": "c2", "OriginalFilename": "c.wav"})
+    writer.close()
+    assert [row["filename"] for row in read_csv(out)] == ["a", "b", "c2", "d", "e"]
+
+
+def test_upsert_requires_key_column(tmp_path, monkeypatch, capsys):
+    out = str(tmp_path / "out.csv")
+    write_csv(out, ["INAM"], [{"INAM": "A"}])
+    with pytest.raises(ValueError):
+        bwf2csv.UpsertWriter(out, ["filename", "INAM"], "filename")
+
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav)
+    monkeypatch.setattr(sys, "argv", ["bwf2csv", "--upsert", "-o", out, wav])
+    with pytest.raises(SystemExit) as e:
+        bwf2csv.main()
+    assert e.value.code == 2
+    assert "no filename column" in capsys.readouterr().err
+    assert read_csv(out) == [{"INAM": "A"}]
+
+
+def test_main_upsert(tmp_path, monkeypatch):
+    out = str(tmp_path / "out.csv")
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav)
+    for _ in range(2):
+        monkeypatch.setattr(sys, "argv", ["bwf2csv", "--upsert", "--fields", "filename,INAM", "-o", out, wav])
+        bwf2csv.main()
+    assert read_csv(out) == [{"filename": wav, "INAM": "Title"}]
+
+
+def test_main_sqlite_requires_filename(tmp_path, monkeypatch, capsys):
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav)
+    out = str(tmp_path / "out.sqlite")
+    monkeypatch.setattr(sys, "argv", ["bwf2csv", "--fields", "OriginalFilename,INAM", "-o", out, wav])
+    with pytest.raises(SystemExit) as e:
+        bwf2csv.main()
+    assert e.value.code == 2
+    assert "requires filename" in capsys.readouterr().err
+
+
+def run(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["bwf2csv", "--fields", "filename,INAM"] + list(argv))
+    bwf2csv.main()
+
+
+def test_recursive_runs_skip_unchanged_files(tmp_path, monkeypatch):
+    top = tmp_path / "archive"
+    (top / "sub").mkdir(parents=True)
+    a, b, c = str(top / "a.wav"), str(top / "sub" / "b.wav"), str(top / "c.wav")
+    make_wave(a)
+    make_wave(b)
+    (top / "notes.txt").write_text("not a Wave file")
+    out = str(tmp_path / "out.csv")
+
+    run(monkeypatch, "-o", out, "-r", str(top))
+    assert sorted(row["filename"] for row in read_csv(out)) == [a, b]
+    make_wave(c)
+    run(monkeypatch, "-o", out, "-r", str(top))
+    assert sorted(row["filename"] for row in read_csv(out)) == sorted([a, b, c])
+
+    # a changed file is extracted again
+    st = os.stat(a)
+    os.utime(a, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    run(monkeypatch, "-o", out, "-r", str(top))
+    assert sorted(row["filename"] for row in read_csv(out)) == sorted([a, a, b, c])
+
+
+def test_interrupted_runs_do_not_mark_files_as_listed(tmp_path, monkeypatch):
+    top = tmp_path / "archive"
+    top.mkdir()
+    a, b = str(top / "a.wav"), str(top / "b.wav")
+    make_wave(a)
+    out = str(tmp_path / "out.csv")
+    run(monkeypatch, "-o", out, "-r", str(top))
+    make_wave(b)
+
+    def failing(self):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(bwf2csv, "checkpoint_rows", 1)
+    with monkeypatch.context() as m:
+        m.setattr(bwf2csv.UpsertWriter, "close", failing)
+        with pytest.raises(OSError):
+            run(monkeypatch, "--upsert", "-o", out, "-r", str(top))
+    # as at the exit of the interrupted process, its uncommitted manifest transaction is rolled back
+    gc.collect()
+    assert [row["filename"] for row in read_csv(out)] == [a]
+    assert not bwf2csv.Manifest(out).unchanged(b)
+
+    run(monkeypatch, "--upsert", "-o", out, "-r", str(top))
+    assert sorted(row["filename"] for row in read_csv(out)) == [a, b]
+
+
+def test_checkpoints_only_cover_written_rows(tmp_path, monkeypatch):
+    files = [str(tmp_path / "{}.wav".format(name)) for name in "abc"]
+    for file in files:
+        make_wave(file)
+    out = str(tmp_path / "out.csv")
+    run(monkeypatch, "-o", out, files[0])
+
+    records = bwf2csv.iter_bwf_records
+
+    def interrupted(*args, **kwargs):
+        for number, record in enumerate(records(*args, **kwargs)):
+            if number == 1:
+                raise KeyboardInterrupt
+            yield record
+
+    monkeypatch.setattr(bwf2csv, "checkpoint_rows", 1)
+    monkeypatch.setattr(bwf2csv, "iter_bwf_records", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        run(monkeypatch, "-o", out, *files)
+    gc.collect()
+    manifest = bwf2csv.Manifest(out)
+    assert [manifest.unchanged(file) for file in files] == [True, True, False]
+    manifest.close()
+    assert [row["filename"] for row in read_csv(out)] == files[:2]
@@ -0,0 +1,22 @@
+import csv
+import io
+import sys
+
+from autoBWF import bwfdedupe
+from conftest import audio, make_wave
+
+
+def test_finds_files_with_identical_audio(tmp_path, monkeypatch, capsys):
+    a, b, c = (str(tmp_path / name) for name in ["a.wav", "b.wav", "c.wav"])
+    make_wave(a)
+    make_wave(b, junk=100, info={"INAM": "Another title"})
+    other = bytearray(audio())
+    other[-1] ^= 1
+    make_wave(c, data=bytes(other))
+
+    monkeypatch.setattr(sys, "argv", ["bwfdedupe", "--samples", "2", str(tmp_path)])
+    bwfdedupe.main()
+    rows = list(csv.DictReader(io.StringIO(capsys.readouterr().out)))
+    assert [row["filename"] for row in rows] == [a, b]
+    assert {row["set"] for row in rows} == {"1"}
+    assert rows[0]["OriginalFilename"] == "a.wav"
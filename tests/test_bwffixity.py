@@ -0,0 +1,122 @@
+import json
+import os
+import sys
+
+import pytest
+
+from autoBWF import BWFchunks, BWFdigest, bwffixity
+from conftest import make_wave
+
+
+def run(monkeypatch, tmp_path, *argv):
+    monkeypatch.setattr(sys, "argv", ["bwffixity", "--state", str(tmp_path / "fixity.sqlite"),
+                                      "--journal", str(tmp_path / "fixity.jsonl")] + list(argv))
+    with pytest.raises(SystemExit) as e:
+        bwffixity.main()
+    return e.value.code
+
+
+def journal(tmp_path):
+    with open(str(tmp_path / "fixity.jsonl")) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    top = tmp_path / "archive"
+    top.mkdir()
+    files = [str(top / name) for name in ["a.wav", "b.wav", "c.wav"]]
+    for file in files:
+        make_wave(file)
+    return str(top), files
+
+
+def test_throttle(monkeypatch):
+    delays = []
+    monkeypatch.setattr(BWFdigest.time, "sleep", delays.append)
+    throttle = BWFdigest.Throttle(1e6)
+    throttle(500000)
+    throttle(500000)
+    assert len(delays) == 2
+    assert 0.4 < delays[0] <= 0.5
+    assert 0.9 < delays[1] <= 1.0
+    assert throttle.total == 1000000
+
+
+def test_verification_is_throttled(tmp_path, monkeypatch):
+    wav = str(tmp_path / "a.wav")
+    data = make_wave(wav)
+    delays = []
+    monkeypatch.setattr(BWFdigest.time, "sleep", delays.append)
+    throttle = BWFdigest.Throttle(1e5)
+    result = bwffixity.verify(wav, throttle, samples=2)
+    assert result["status"] == "ok"
+    # the whole data chunk is read for the digest, and the sampled blocks once more for the fingerprint
+    assert throttle.total > len(data)
+    assert delays and max(delays) > 0.9 * len(data) / 1e5
+
+
+def test_queue_order(tmp_path):
+    state = bwffixity.FixityState(str(tmp_path / "fixity.sqlite"))
+    paths = [os.path.abspath(str(tmp_path / name)) for name in ["a.wav", "b.wav", "c.wav"]]
+    state.register(paths)
+    for path, verified in [(paths[1], 100.0), (paths[2], 50.0)]:
+        state.record(path, {"size": 1, "mtime_ns": 1, "time": verified, "status": "ok", "stored": "", "generated": "",
+                            "fingerprint": None, "samples": 8})
+    assert list(state.queue(200)) == [paths[0], paths[2], paths[1]]
+    assert list(state.queue(75)) == [paths[0], paths[2]]
+    state.flag(paths[1], "changed")
+    assert list(state.queue(75)) == [paths[0], paths[1], paths[2]]
+    state.close()
+
+
+def test_interrupted_audit_is_resumed(tmp_path, monkeypatch, archive):
+    top, files = archive
+    verify = bwffixity.verify
+    calls = []
+
+    def interrupted(path, *args):
+        calls.append(path)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return verify(path, *args)
+
+    with monkeypatch.context() as m:
+        m.setattr(bwffixity, "verify", interrupted)
+        assert run(monkeypatch, tmp_path, top) == 0
+    first = [entry["path"] for entry in journal(tmp_path)]
+    assert len(first) == 1
+
+    # the next run verifies only the files that were not verified by the interrupted one
+    assert run(monkeypatch, tmp_path, top) == 0
+    second = [entry["path"] for entry in journal(tmp_path)][1:]
+    assert sorted(first + second) == sorted(files)
+    assert {entry["status"] for entry in journal(tmp_path)} == {"ok"}
+
+    assert run(monkeypatch, tmp_path, top) == 0
+    assert len(journal(tmp_path)) == 3
+
+
+def test_quick_check_flags_changed_files(tmp_path, monkeypatch, archive, capsys):
+    top, files = archive
+    assert run(monkeypatch, tmp_path, top) == 0
+    assert run(monkeypatch, tmp_path, "--quick", top) == 0
+    assert [entry["status"] for entry in journal(tmp_path)[3:]] == ["unchanged"] * 3
+
+    # damage the first block of audio (which the fingerprint samples), leaving the size and mtime unchanged
+    st = os.stat(files[1])
+    with BWFchunks.WaveFile(files[1]) as wave:
+        offset = wave.find("data").offset
+    with open(files[1], "r+b") as f:
+        f.seek(offset)
+        f.write(b"\xff" * 16)
+    os.utime(files[1], ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    assert run(monkeypatch, tmp_path, "--quick", top) == 1
+    assert "{}: changed".format(files[1]) in capsys.readouterr().err
+    assert [entry["status"] for entry in journal(tmp_path)[6:]].count("changed") == 1
+
+    # the flagged file is fully verified by the next run, although it was verified within the interval
+    assert run(monkeypatch, tmp_path, top) == 1
+    entries = journal(tmp_path)[9:]
+    assert [(entry["path"], entry["status"]) for entry in entries] == [(files[1], "failed")]
@@ -0,0 +1,43 @@
+import csv
+import io
+import sys
+
+import pytest
+
+from autoBWF import bwfquery
+from conftest import make_wave
+
+
+def query(monkeypatch, capsys, *argv):
+    monkeypatch.setattr(sys, "argv", ["bwfquery"] + list(argv))
+    bwfquery.main()
+    return capsys.readouterr()
+
+
+def test_parse_condition():
+    fields = ["filename", "INAM"]
+    assert bwfquery.parse_condition("INAM=A=B", fields) == ('"INAM" = ?', "A=B")
+    assert bwfquery.parse_condition("filename~50%", fields) == ('"path" LIKE ? ESCAPE \'\\\'', "%50\\%%")
+    with pytest.raises(ValueError):
+        bwfquery.parse_condition("ICRD=1970", fields)
+    with pytest.raises(ValueError):
+        bwfquery.parse_condition("INAM", fields)
+
+
+def test_update_and_query(tmp_path, monkeypatch, capsys):
+    top = tmp_path / "archive"
+    top.mkdir()
+    a, b = str(top / "a.wav"), str(top / "b.wav")
+    make_wave(a)
+    make_wave(b, info={"INAM": "Other", "ICRD": "1980"})
+    db = str(tmp_path / "catalogue.sqlite")
+
+    assert "2 file(s) added" in query(monkeypatch, capsys, "--catalogue", db, "-u", str(top)).err
+    assert "0 file(s) added" in query(monkeypatch, capsys, "--catalogue", db, "-u", str(top)).err
+
+    out = query(monkeypatch, capsys, "--catalogue", db, "--fields", "filename,INAM", "ICRD>=1975").out
+    assert list(csv.DictReader(io.StringIO(out))) == [{"filename": b, "INAM": "Other"}]
+    assert query(monkeypatch, capsys, "--catalogue", db, "--count", "INAM~titl").out == "1\n"
+
+    (top / "b.wav").unlink()
+    assert "1 file(s) removed" in query(monkeypatch, capsys, "--catalogue", db, "--prune").err
@@ -0,0 +1,27 @@
+import sys
+
+import pytest
+
+from autoBWF import bwftree
+from conftest import make_wave
+
+
+def run(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["bwftree"] + list(argv))
+    with pytest.raises(SystemExit) as e:
+        bwftree.main()
+    return e.value.code
+
+
+def test_create_and_verify(tmp_path, monkeypatch, capsys):
+    wav = str(tmp_path / "a.wav")
+    make_wave(wav)
+    assert run(monkeypatch, "create", "--leaf-size", "1", "-j", "2", wav) == 0
+    assert run(monkeypatch, "verify", wav) == 0
+    assert capsys.readouterr().out == "{}: ok\n".format(wav)
+
+    with open(wav, "r+b") as f:
+        f.seek(-1000, 2)
+        f.write(b"\xff" * 10)
+    assert run(monkeypatch, "verify", "--jobs", "0", wav) == 1
+    assert "damaged data bytes" in capsys.readouterr().out
@@ -0,0 +1,64 @@
+import csv
+import sys
+
+import pytest
+
+from autoBWF import BWFfileIO, csv2bwf
+from autoBWF.BWFfileIO import Backend
+from conftest import make_wave
+
+
+def write_sheet(tmp_path, files, **values):
+    for file in files:
+        make_wave(file)
+    sheet = str(tmp_path / "in.csv")
+    with open(sheet, "w", newline="") as f:
+        writer = csv.DictWriter(f, ["filename"] + list(values))
+        writer.writeheader()
+        writer.writerows(dict(values, filename=file) for file in files)
+    return sheet
+
+
+def test_xmp_failures_are_reported_per_file(tmp_path, monkeypatch, capsys):
+    files = [str(tmp_path / name) for name in ["a.wav", "b.wav", "c.wav"]]
+    sheet = write_sheet(tmp_path, files, interviewer="Alice")
+    set_xmp = csv2bwf.set_xmp
+
+    def failing(md, filename, backend=None):
+        if filename == files[1]:
+            raise PermissionError("read-only file")
+        set_xmp(md, filename, backend=backend)
+
+    monkeypatch.setattr(csv2bwf, "set_xmp", failing)
+    monkeypatch.setattr(sys, "argv", ["csv2bwf", "-j", "2", sheet])
+    with pytest.raises(SystemExit) as e:
+        csv2bwf.main()
+    assert e.value.code == "1 file(s) could not be updated"
+    assert "{}: could not write XMP (read-only file)".format(files[1]) in capsys.readouterr().err
+    assert [BWFfileIO.get_xmp(file)["interviewer"] for file in files] == ["Alice", "Bob", "Alice"]
+
+
+def test_core_failures_are_reported_per_file(tmp_path, monkeypatch, capsys):
+    files = [str(tmp_path / name) for name in ["a.wav", "b.wav"]]
+    sheet = write_sheet(tmp_path, files, INAM="New title", interviewer="Alice")
+    monkeypatch.setattr(csv2bwf, "default_backend", lambda: Backend(executable=str(tmp_path / "no-bwfmetaedit")))
+    monkeypatch.setattr(sys, "argv", ["csv2bwf", sheet])
+    with pytest.raises(SystemExit) as e:
+        csv2bwf.main()
+    assert e.value.code == "2 file(s) could not be updated"
+    err = capsys.readouterr().err
+    for file in files:
+        assert "{}: could not write core metadata (could not run".format(file) in err
+        assert BWFfileIO.get_xmp(file)["interviewer"] == "Alice"
+
+
+@pytest.mark.parametrize("executable, failed", [("true", False), ("false", True)])
+def test_set_bwf_core_many_checks_the_exit_status(tmp_path, executable, failed):
+    files = [str(tmp_path / name) for name in ["a.wav", "b.wav"]]
+    for file in files:
+        make_wave(file)
+    errors = BWFfileIO.set_bwf_core_many({file: {"INAM": "x"} for file in files}, Backend(executable=executable))
+    if failed:
+        assert errors == {file: "bwfmetaedit exited with status 1" for file in files}
+    else:
+        assert errors == {}
@@ -0,0 +1,50 @@
+import json
+import sqlite3
+
+import pytest
+
+from autoBWF import sinks
+
+
+def test_guess_format():
+    assert sinks.guess_format(None) == "csv"
+    assert sinks.guess_format("out.CSV") == "csv"
+    assert sinks.guess_format("out.ndjson") == "jsonl"
+    assert sinks.guess_format("out.db") == "sqlite"
+    assert sinks.guess_format("out.parquet") == "parquet"
+
+
+def test_jsonl_sink_appends(tmp_path):
+    out = str(tmp_path / "out.jsonl")
+    for value in ["a", "b"]:
+        sink = sinks.open_sink("jsonl", out, ["filename"])
+        sink.writerow({"filename": value, "INAM": "ignored"})
+        sink.close()
+    with open(out, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [{"filename": "a"}, {"filename": "b"}]
+
+
+def test_sqlite_sink_replaces_rows_and_adds_columns(tmp_path):
+    out = str(tmp_path / "out.sqlite")
+    sink = sinks.open_sink("sqlite", out, ["filename", "INAM"])
+    sink.writerow({"filename": "a", "INAM": "A"})
+    sink.writerow({"filename": "b", "INAM": "B"})
+    sink.close()
+    sink = sinks.open_sink("sqlite", out, ["filename", "INAM", "FileUse"])
+    sink.writerow({"filename": "a", "INAM": "A2", "FileUse": "PM"})
+    sink.close()
+
+    db = sqlite3.connect(out)
+    assert db.execute('SELECT filename, INAM, FileUse FROM bwf ORDER BY filename').fetchall() == [
+        ("a", "A2", "PM"), ("b", "B", None)]
+    db.close()
+
+
+def test_sqlite_sink_requires_filename(tmp_path):
+    with pytest.raises(ValueError):
+        sinks.open_sink("sqlite", str(tmp_path / "out.sqlite"), ["OriginalFilename", "INAM"])
+
+
+def test_open_sink_requires_outfile():
+    with pytest.raises(ValueError):
+        sinks.open_sink("sqlite", None, ["filename"])